@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Banc d'essai de mise à l'échelle: génère des jeux synthétiques de tailles
+croissantes, puis mesure l'ingestion et chaque mode d'analyse (temps, débit,
+pic de mémoire). Chaque exécution est ajoutée à un historique JSON et
+comparée à la précédente exécution de même configuration.
+
+Les mesures utilisent une base dédiée (ecommerce_bench) sur un mongod, ou
+un substitut en mémoire (mongomock, --in-process) quand aucun serveur n'est
+disponible. Le substitut ne gère pas tous les opérateurs d'agrégation: les
+étapes concernées sont enregistrées avec leur erreur.
+
+--storages collection,timeseries mesure chaque taille avec les deux formats
+de la collection events (classique, série temporelle) et compare leur taille
+sur disque, leur débit d'ingestion et la latence des agrégations (mongod seulement).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+from pymongo import MongoClient
+
+from compact_frame import load_compact_frame
+from generate_events import DEFAULT_USERS, parse_count, write_events
+from instrumentation import reset_peak_rss, stage_peak_rss_mb
+from ingest_data import (MONGO_URI, COLLECTION_NAME, DEFAULT_BATCH_SIZE, DEFAULT_WORKERS,
+                         DEFAULT_WRITERS, create_indexes, create_timeseries_collection, import_data,
+                         parallel_import_data)
+from parallel_analysis import parallel_analysis
+from rollups import ROLLUP_COLLECTIONS, rebuild_rollups
+from simple_analysis import (average_clicks_before_purchase, top_searches_by_hour, top_products_by_region,
+                             top_searches_by_hour_pushdown, top_products_by_region_pushdown,
+                             rollup_analysis, streaming_analysis)
+from snapshot import export_snapshot, read_snapshot
+
+# Configuration
+BENCH_DB = "ecommerce_bench"
+BENCH_DIR = '/app/data/benchmarks'
+HISTORY_NAME = 'history.json'
+DEFAULT_SCALES = "10k,100k,1M"
+STAGES = ["ingest", "dataframe", "compact", "parallel", "pushdown", "streaming", "rollups", "snapshot", "spark"]
+DEFAULT_STAGES = [stage for stage in STAGES if stage != "spark"]
+STORAGES = ["collection", "timeseries"]
+# Ralentissement toléré avant de signaler une régression, et durée sous laquelle on ignore le bruit
+MAX_SLOWDOWN = 1.25
+MIN_COMPARED_SECONDS = 0.05
+
+def measure(stage, events, func, verbose=False):
+    """Exécute une étape et retourne sa mesure (l'échec d'une étape n'arrête pas le banc)"""
+    reset_peak_rss()
+    error = None
+    start_time = time.perf_counter()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            func()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start_time
+    record = {
+        "stage": stage,
+        "events": events,
+        "wall_s": round(wall, 4),
+        "events_per_s": round(events / wall) if wall > 0 and not error else None,
+        "peak_rss_mb": round(stage_peak_rss_mb(), 1),
+    }
+    if error:
+        record["error"] = error
+    status = f"ÉCHEC ({error})" if error else f"{wall:.2f}s, {record['events_per_s']} évts/s"
+    print(f"  {stage:<10} {status}, pic mémoire {record['peak_rss_mb']} Mo")
+    return record
+
+def dataset_path(data_dir, events, seed, users, skew):
+    """Fichier synthétique d'une configuration (réutilisé d'une exécution à l'autre)"""
+    return os.path.join(data_dir, f"events_{events}_s{seed}_u{users}_z{skew:g}.json")
+
+def run_dataframe(collection):
+    df = pd.DataFrame(list(collection.find()))
+    average_clicks_before_purchase(df)
+    top_searches_by_hour(df)
+    top_products_by_region(df)
+
+def run_compact(collection):
+    df, _ = load_compact_frame(collection)
+    average_clicks_before_purchase(df)
+    top_searches_by_hour(df)
+    top_products_by_region(df)
+
+def run_parallel(collection, workers):
+    df, _ = load_compact_frame(collection)
+    parallel_analysis(df, workers)
+
+def run_pushdown(collection):
+    top_searches_by_hour_pushdown(collection)
+    top_products_by_region_pushdown(collection)
+
+def run_spark(uri):
+    from spark_analysis import (create_spark_session, load_data, top_categories_by_hour,
+                                average_clicks_before_purchase as spark_average_clicks,
+                                top_products_by_region as spark_top_products)
+    spark = create_spark_session()
+    df = load_data(spark, uri=f"{uri}{BENCH_DB}.{COLLECTION_NAME}")
+    df.count()
+    spark_average_clicks(df)
+    top_categories_by_hour(df)
+    spark_top_products(df)
+    df.unpersist()
+
+def disk_size_mb(client, collection):
+    """Taille sur disque de la collection et de ses index, après un point de contrôle"""
+    client.admin.command("fsync")
+    stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    return round((stats.get("storageSize", 0) + stats.get("totalIndexSize", 0)) / 1024 / 1024, 1)
+
+def run_scale(client, events, args, storage="collection"):
+    """Toutes les étapes demandées pour une taille de jeu de données et un format de stockage"""
+    path = dataset_path(args.data_dir, events, args.seed, args.users, args.skew)
+    if not os.path.exists(path):
+        write_events(path, events, args.seed, args.users, skew=args.skew)
+
+    db = client[BENCH_DB]
+    collection = db[COLLECTION_NAME]
+    for name in [COLLECTION_NAME] + ROLLUP_COLLECTIONS:
+        db[name].drop()
+    timeseries = storage == "timeseries"
+    if timeseries:
+        create_timeseries_collection(db)
+
+    def ingest():
+        # Le substitut en mémoire n'accepte pas les documents BSON pré-encodés
+        if args.ingest == "parallel" and not args.in_process:
+            parallel_import_data(path, collection, args.workers, args.writers, args.batch_size, args.typed,
+                                 timeseries=timeseries)
+        else:
+            import_data(path, collection, args.typed, timeseries=timeseries)
+        create_indexes(collection)
+
+    snapshot_dir = os.path.join(args.data_dir, f"snapshot_{events}")
+
+    def snapshot():
+        export_snapshot(collection, snapshot_dir, force=True)
+        read_snapshot(snapshot_dir)
+
+    def rollups():
+        rebuild_rollups(db)
+        rollup_analysis(db)
+
+    runners = {
+        "ingest": ingest,
+        "dataframe": lambda: run_dataframe(collection),
+        "compact": lambda: run_compact(collection),
+        "parallel": lambda: run_parallel(collection, args.workers),
+        "pushdown": lambda: run_pushdown(collection),
+        "streaming": lambda: streaming_analysis(collection, args.stream_batch_size),
+        "rollups": rollups,
+        "snapshot": snapshot,
+        "spark": lambda: run_spark(args.mongo_uri),
+    }
+
+    print(f"Taille {events}" + (f" ({storage}):" if len(args.storages) > 1 else ":"))
+    records = []
+    for stage in args.stages:
+        if stage == "spark" and args.in_process:
+            print("  spark      ignoré (le substitut en mémoire n'est pas accessible à Spark)")
+            continue
+        record = measure(stage, events, runners[stage], args.verbose)
+        record["scale"] = events
+        record["storage"] = storage
+        if stage == "ingest" and "error" not in record and not args.in_process:
+            record["disk_mb"] = disk_size_mb(client, collection)
+            print(f"  {'':<10} taille sur disque {record['disk_mb']} Mo (données et index)")
+        records.append(record)
+    return records
+
+def compare_storages(results):
+    """Tableau des formats de stockage par taille: disque, débit d'ingestion, latence des agrégations"""
+    by_key = {(r["scale"], r.get("storage", "collection"), r["stage"]): r for r in results if "error" not in r}
+    print("\nComparaison des formats de stockage:")
+    print(f"  {'taille':>10} {'format':<11} {'disque':>10} {'ingestion':>14} {'agrégations':>12}")
+    for scale in sorted({r["scale"] for r in results}):
+        for storage in STORAGES:
+            ingest = by_key.get((scale, storage, "ingest"))
+            pushdown = by_key.get((scale, storage, "pushdown"))
+            if not ingest and not pushdown:
+                continue
+            disk = f"{ingest['disk_mb']} Mo" if ingest and "disk_mb" in ingest else "-"
+            rate = f"{ingest['events_per_s']} évts/s" if ingest else "-"
+            latency = f"{pushdown['wall_s']:.3f}s" if pushdown else "-"
+            print(f"  {scale:>10} {storage:<11} {disk:>10} {rate:>14} {latency:>12}")
+
+def load_history(history_path):
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as file:
+        return json.load(file)
+
+def save_history(history_path, history):
+    """Écriture atomique de l'historique"""
+    tmp_path = f"{history_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(history, file, indent=2)
+    os.replace(tmp_path, history_path)
+
+def compare_runs(previous, run, max_slowdown=MAX_SLOWDOWN):
+    """Compare une exécution à la précédente de même configuration; retourne les régressions"""
+    def key(record):
+        return record["scale"], record.get("storage", "collection"), record["stage"]
+
+    before = {key(r): r for r in previous["results"] if "error" not in r}
+    regressions = []
+    print(f"\nComparaison avec l'exécution du {previous['run_at']}:")
+    for record in run["results"]:
+        old = before.get(key(record))
+        if old is None or "error" in record:
+            continue
+        ratio = record["wall_s"] / old["wall_s"] if old["wall_s"] > 0 else 1.0
+        flag = ""
+        if ratio > max_slowdown and record["wall_s"] >= MIN_COMPARED_SECONDS:
+            flag = "  <-- régression"
+            regressions.append({**record, "previous_wall_s": old["wall_s"], "ratio": round(ratio, 2)})
+        print(f"  {record['scale']:>10} {record['storage']:<11} {record['stage']:<10} {old['wall_s']:.2f}s -> "
+              f"{record['wall_s']:.2f}s (x{ratio:.2f}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de l'ingestion et des analyses à plusieurs échelles")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="Tailles séparées par des virgules (ex: 10k,1M,10M,100M)")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                        help=f"Étapes mesurées parmi {','.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="Nombre d'utilisateurs distincts")
+    parser.add_argument("--skew", type=float, default=0.0, help="Exposant de Zipf (0: uniforme)")
+    parser.add_argument("--mongo-uri", default=MONGO_URI, help="Serveur MongoDB mesuré")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Utilise un substitut MongoDB en mémoire (mongomock) au lieu d'un serveur")
+    parser.add_argument("--ingest", choices=["parallel", "serial"], default="parallel",
+                        help="Chemin d'ingestion mesuré")
+    parser.add_argument("--typed", action="store_true", help="Ingestion au schéma typé")
+    parser.add_argument("--storages", default="collection",
+                        help=f"Formats de la collection events mesurés parmi {','.join(STORAGES)} "
+                             "(timeseries: série temporelle, nécessite un mongod)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processus d'ingestion et de l'étape parallel")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--stream-batch-size", type=int, default=10000,
+                        help="Taille des lots du curseur en mode streaming")
+    parser.add_argument("--data-dir", default=BENCH_DIR, help="Répertoire des jeux générés et de l'historique")
+    parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN,
+                        help="Ralentissement toléré par rapport à l'exécution précédente")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Code de sortie 1 si une régression est détectée")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie des étapes mesurées")
+    args = parser.parse_args()
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Étapes inconnues: {', '.join(sorted(unknown))}")
+    args.storages = [storage.strip() for storage in args.storages.split(",") if storage.strip()]
+    unknown = set(args.storages) - set(STORAGES)
+    if unknown:
+        parser.error(f"Formats inconnus: {', '.join(sorted(unknown))}")
+    if "timeseries" in args.storages and args.in_process:
+        parser.error("Le substitut en mémoire ne gère pas les séries temporelles: mesurez-les sur un mongod")
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    if args.in_process:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--in-process nécessite le paquet mongomock (pip install mongomock)")
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(args.mongo_uri)
+
+    scales = [parse_count(scale) for scale in args.scales.split(",")]
+    run = {
+        "run_at": datetime.utcnow().isoformat(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "backend": "mongomock" if args.in_process else "mongod",
+        "config": {"seed": args.seed, "users": args.users, "skew": args.skew, "typed": args.typed,
+                   "ingest": args.ingest, "workers": args.workers, "writers": args.writers,
+                   "batch_size": args.batch_size, "stream_batch_size": args.stream_batch_size},
+        "results": [],
+    }
+    for events in scales:
+        for storage in args.storages:
+            run["results"].extend(run_scale(client, events, args, storage))
+    if len(args.storages) > 1:
+        compare_storages(run["results"])
+
+    history_path = os.path.join(args.data_dir, HISTORY_NAME)
+    history = load_history(history_path)
+    previous = next((old for old in reversed(history)
+                     if old["backend"] == run["backend"] and old["config"] == run["config"]), None)
+    regressions = compare_runs(previous, run, args.max_slowdown) if previous else []
+    history.append(run)
+    save_history(history_path, history)
+    print(f"\nRésultats ajoutés à {history_path}")
+
+    if regressions:
+        print(f"{len(regressions)} régressions au-delà de x{args.max_slowdown}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
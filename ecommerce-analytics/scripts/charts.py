@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Étape de rendu des graphiques, séparée des analyses.
+Les tables de résultats sont converties en tâches de rendu exécutées dans
+un pool de processus (backend Agg, sans affichage). Un graphique dont les
+données n'ont pas changé depuis le dernier rendu n'est pas redessiné.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import stage
+
+# Configuration
+OUTPUT_DIR = '/app/data/results'
+CACHE_NAME = '.chart_cache.json'
+# À incrémenter quand le style des graphiques change, pour invalider le cache
+CHART_VERSION = 1
+
+def _records(df, columns):
+    """Lignes d'une table de résultats, en types Python simples"""
+    return [{column: (int(value) if column in ('hour', 'count') else value)
+             for column, value in zip(columns, row)}
+            for row in df[columns].itertuples(index=False)]
+
+def chart_jobs(top_searches=None, top_products=None, n=10):
+    """
+    Construit les tâches de rendu à partir des tables de résultats:
+    top_searches avec les colonnes hour, top_search, count;
+    top_products en dictionnaire région -> table product_id, category, count.
+    """
+    jobs = []
+    if top_searches is not None and len(top_searches):
+        jobs.append({
+            "file": "top_searches_by_hour.png",
+            "kind": "searches",
+            "rows": _records(top_searches, ['hour', 'top_search', 'count']),
+        })
+    for region, data in (top_products or {}).items():
+        if len(data):
+            jobs.append({
+                "file": f"top10_products_region_{region}.png",
+                "kind": "products",
+                "region": region,
+                "n": n,
+                "rows": _records(data, ['product_id', 'category', 'count']),
+            })
+    return jobs
+
+def job_hash(job):
+    """Empreinte des données et du style d'un graphique"""
+    payload = json.dumps({"version": CHART_VERSION, **job}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def render_job(task):
+    """Dessine un graphique dans un processus de travail et ferme la figure"""
+    job, output_dir = task
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    rows = job["rows"]
+    if job["kind"] == "searches":
+        fig = plt.figure(figsize=(12, 8))
+        plt.bar([r['hour'] for r in rows], [r['count'] for r in rows], color='skyblue')
+        plt.title('Terme de recherche le plus populaire par heure')
+        plt.xlabel('Heure de la journée')
+        plt.ylabel('Nombre de recherches')
+        plt.xticks(range(24))
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+        # Ajout des annotations
+        for r in rows:
+            plt.text(r['hour'], r['count'], r['top_search'],
+                     ha='center', va='bottom', rotation=45, fontsize=8)
+    else:
+        fig = plt.figure(figsize=(12, 6))
+        bars = plt.bar([r['product_id'] for r in rows], [r['count'] for r in rows],
+                       color=sns.color_palette("husl", len(rows)))
+
+        # Ajout des étiquettes de catégorie
+        for bar, r in zip(bars, rows):
+            plt.text(bar.get_x() + bar.get_width()/2,
+                     bar.get_height() + 0.3,
+                     r['category'],
+                     ha='center', va='bottom', rotation=45, fontsize=8)
+
+        plt.title(f"Top {job['n']} des produits consultés - Région {job['region']}")
+        plt.xlabel('ID du produit')
+        plt.ylabel('Nombre de clics')
+        plt.xticks(rotation=45)
+
+    # Sauvegarde puis libération de la figure
+    plt.tight_layout()
+    path = os.path.join(output_dir, job["file"])
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+def _load_cache(output_dir):
+    path = os.path.join(output_dir, CACHE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def render_charts(top_searches=None, top_products=None, n=10, output_dir=OUTPUT_DIR, workers=None):
+    """
+    Rend les graphiques dont les données ont changé, en parallèle.
+    Retourne la liste des fichiers redessinés.
+    """
+    jobs = chart_jobs(top_searches, top_products, n)
+    with stage("chart_render", rows_in=len(jobs)) as render:
+        os.makedirs(output_dir, exist_ok=True)
+        cache = _load_cache(output_dir)
+
+        pending = []
+        for job in jobs:
+            digest = job_hash(job)
+            if cache.get(job["file"]) == digest and os.path.exists(os.path.join(output_dir, job["file"])):
+                continue
+            pending.append((job, digest))
+
+        skipped = len(jobs) - len(pending)
+        tasks = [(job, output_dir) for job, _ in pending]
+        if len(tasks) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers or min(len(tasks), os.cpu_count() or 1)) as pool:
+                paths = list(pool.map(render_job, tasks))
+        else:
+            paths = [render_job(task) for task in tasks]
+
+        for (job, digest), path in zip(pending, paths):
+            cache[job["file"]] = digest
+            print(f"Graphique sauvegardé: {path}")
+        with open(os.path.join(output_dir, CACHE_NAME), 'w') as file:
+            json.dump(cache, file, indent=2, sort_keys=True)
+
+        if skipped:
+            print(f"{skipped} graphiques inchangés non redessinés")
+        render.rows_out = len(paths)
+    return paths
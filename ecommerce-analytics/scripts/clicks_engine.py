@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Moteur vectorisé pour le calcul des clics avant achat.
+Partagé par simple_analysis.py et spark_analysis.py.
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+# Fichier d'exemple utilisé pour la vérification de non-régression
+SAMPLE_PATH = "/app/data/ecommerce_events.json"
+
+def clicks_per_purchase(df):
+    """
+    Retourne, pour chaque achat, le nombre de clics effectués depuis
+    l'achat précédent du même utilisateur (ou depuis son premier événement).
+
+    Un seul tri par (user_id, timestamp), puis des sommes cumulées par
+    utilisateur remises à zéro à chaque achat.
+    """
+    if df.empty:
+        return pd.Series([], dtype='int64')
+
+    # Tri unique (stable pour conserver l'ordre des égalités de timestamp)
+    events = df[['user_id', 'timestamp', 'event_type']].sort_values(
+        ['user_id', 'timestamp'], kind='mergesort')
+
+    # Clés de groupe entières par utilisateur
+    user_key = pd.factorize(events['user_id'])[0]
+    is_click = (events['event_type'] == 'click').to_numpy(dtype='int64')
+    is_purchase = (events['event_type'] == 'purchase').to_numpy()
+
+    # Nombre cumulé de clics par utilisateur
+    cum_clicks = pd.Series(is_click).groupby(user_key).cumsum().to_numpy()
+
+    # Aux achats: clics cumulés moins ceux de l'achat précédent du même utilisateur
+    purchase_users = user_key[is_purchase]
+    purchase_cum = pd.Series(cum_clicks[is_purchase])
+    previous = purchase_cum.groupby(purchase_users).shift(1).fillna(0).astype('int64')
+
+    return (purchase_cum - previous).reset_index(drop=True)
+
+def average_clicks(df):
+    """Nombre moyen de clics avant achat (0 s'il n'y a aucun achat)."""
+    counts = clicks_per_purchase(df)
+    if counts.empty:
+        return 0
+    return float(counts.sum() / len(counts))
+
+def _iterrows_clicks_per_purchase(df):
+    """Implémentation historique par iterrows(), conservée comme référence."""
+    df = df.sort_values(['user_id', 'timestamp'])
+
+    user_sequences = []
+    current_user = None
+    click_count = 0
+
+    for _, row in df.iterrows():
+        if current_user != row['user_id']:
+            current_user = row['user_id']
+            click_count = 0
+
+        if row['event_type'] == 'click':
+            click_count += 1
+        elif row['event_type'] == 'purchase':
+            user_sequences.append(click_count)
+            click_count = 0
+
+    return user_sequences
+
+def verify(file_path):
+    """Compare le moteur vectorisé à la boucle historique sur un fichier JSON."""
+    df = pd.read_json(file_path, lines=True)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+    expected = _iterrows_clicks_per_purchase(df)
+    actual = clicks_per_purchase(df).tolist()
+
+    if actual != expected:
+        print(f"Écart détecté: {len(actual)} achats calculés contre {len(expected)} attendus")
+        return False
+
+    print(f"Vérification réussie: {len(actual)} achats, "
+          f"moyenne {sum(actual) / len(actual) if actual else 0:.2f} clics avant achat")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--verify", metavar="FICHIER", nargs="?", const=SAMPLE_PATH,
+                        help="Compare le moteur vectorisé à la boucle iterrows()")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(args.verify) else 1)
+    parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Chargement compact de la collection events dans pandas.
+
+Par rapport au DataFrame d'objets Python de connect_to_mongodb:
+- seules les colonnes des analyses demandées sont transférées (ni _id ni price);
+- les identifiants utilisateurs sont codés en entiers (U1931 -> 1931);
+- les champs de faible cardinalité sont des catégories (codes + dictionnaire);
+- timestamp est converti une seule fois en datetime64.
+Le curseur est converti par lots: le DataFrame d'objets n'est jamais
+matérialisé en entier, sa taille est seulement mesurée lot par lot.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Colonnes lues par chaque analyse
+ANALYSIS_FIELDS = {
+    "avg_clicks": ["user_id", "timestamp", "event_type"],
+    "top_searches": ["timestamp", "event_type", "search_query"],
+    "top_products": ["event_type", "region", "product_id", "category"],
+}
+ANALYSES = list(ANALYSIS_FIELDS)
+CATEGORICAL_FIELDS = ["event_type", "region", "search_query", "product_id", "category"]
+# Identifiants codés en entiers quand ils sont tous de la forme préfixe + nombre
+INTEGER_ID_FIELDS = {"user_id": "U"}
+
+LOAD_BATCH_SIZE = 100000
+
+def fields_for(analyses):
+    """Colonnes nécessaires à un ensemble d'analyses, dans un ordre stable"""
+    fields = []
+    for analysis in analyses:
+        fields.extend(field for field in ANALYSIS_FIELDS[analysis] if field not in fields)
+    return fields
+
+def encode_ids(values, prefix):
+    """
+    Code des identifiants « préfixe + nombre » en entiers. Retourne None si un
+    identifiant ne s'y prête pas (absent, autre forme, zéros non significatifs),
+    pour que le décodage soit toujours exact.
+    """
+    pattern = re.compile(rf"^{re.escape(prefix)}(0|[1-9][0-9]{{0,17}})$")
+    if values.isna().any() or not values.map(lambda value: bool(pattern.match(str(value)))).all():
+        return None
+    codes = values.str.slice(len(prefix)).astype('int64')
+    if codes.max() < np.iinfo('int32').max:
+        codes = codes.astype('int32')
+    return codes
+
+def compact_batch(docs, fields):
+    """
+    Convertit un lot de documents en DataFrame compact.
+    Retourne (DataFrame compact, taille en octets du même lot en objets Python).
+    """
+    frame = pd.DataFrame(docs, columns=fields)
+    object_bytes = int(frame.memory_usage(deep=True).sum())
+
+    for field in fields:
+        if field == "timestamp":
+            frame[field] = pd.to_datetime(frame[field])
+        elif field in INTEGER_ID_FIELDS:
+            codes = encode_ids(frame[field], INTEGER_ID_FIELDS[field])
+            frame[field] = codes if codes is not None else frame[field].astype('category')
+        elif field in CATEGORICAL_FIELDS:
+            frame[field] = frame[field].astype('category')
+    return frame, object_bytes
+
+def _as_category(column, field):
+    """Colonne catégorielle (les identifiants codés en entiers sont décodés)"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.array
+    prefix = INTEGER_ID_FIELDS.get(field, "")
+    return pd.Categorical(prefix + column.astype(str))
+
+def concat_compact(frames, fields):
+    """Concatène des lots compacts en unifiant les dictionnaires des catégories"""
+    if not frames:
+        return pd.DataFrame({field: pd.Series(dtype='object') for field in fields})
+    columns = {}
+    for field in fields:
+        parts = [frame[field] for frame in frames]
+        if any(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[field] = pd.Series(union_categoricals(
+                [_as_category(part, field) for part in parts], sort_categories=True))
+        else:
+            columns[field] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+def load_compact_frame(collection, analyses=ANALYSES, query=None, batch_size=LOAD_BATCH_SIZE):
+    """
+    Charge les colonnes des analyses demandées dans un DataFrame compact,
+    dans l'ordre du curseur. Retourne (DataFrame, rapport mémoire).
+    """
+    fields = fields_for(analyses)
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
+
+    frames, batch, object_bytes = [], [], 0
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            frame, size = compact_batch(batch, fields)
+            frames.append(frame)
+            object_bytes += size
+            batch = []
+    if batch:
+        frame, size = compact_batch(batch, fields)
+        frames.append(frame)
+        object_bytes += size
+
+    df = concat_compact(frames, fields)
+    compact_bytes = int(df.memory_usage(deep=True).sum())
+    report = {
+        "rows": len(df),
+        "columns": fields,
+        "object_mb": object_bytes / 1024 / 1024,
+        "compact_mb": compact_bytes / 1024 / 1024,
+        "ratio": object_bytes / compact_bytes if compact_bytes else 0,
+    }
+    print(f"Mémoire du DataFrame: {report['object_mb']:.1f} Mo en objets Python -> "
+          f"{report['compact_mb']:.1f} Mo compact (x{report['ratio']:.1f}), {len(df)} lignes")
+    return df, report
+
+def plain_columns(df):
+    """Repasse les colonnes catégorielles d'un petit résultat au type de leurs valeurs"""
+    categorical = {column: df[column].cat.categories.dtype for column in df.columns
+                   if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    return df.astype(categorical) if categorical else df
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Analyses directement depuis un fichier d'événements, sans serveur MongoDB.
+
+Le fichier JSONL (ou sa conversion Parquet) est lu paresseusement par
+pyarrow.dataset: chaque analyse ne lit que ses colonnes, avec son filtre
+(event_type == 'search', == 'click'...) appliqué pendant la lecture, lot par
+lot. Sur Parquet, le filtre élimine aussi les partitions event_type et les
+groupes de lignes inutiles.
+
+La mémoire ne dépend pas de la taille du fichier:
+- recherches par heure et produits par région: comptes partiels par lot,
+  fusionnés au fil de l'eau (mémoire proportionnelle au nombre de clés);
+- clics avant achat: les clics et achats sont répartis sur disque en
+  partitions par hachage de user_id, puis chaque partition est traitée seule.
+Les résultats sont identiques à ceux des modes MongoDB.
+"""
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.json as pajson
+
+from clicks_engine import SAMPLE_PATH, clicks_per_purchase
+from parallel_analysis import partition_keys
+from simple_analysis import (average_clicks_before_purchase, top_searches_by_hour, top_products_by_region,
+                             select_top_searches, select_top_products, results_match)
+
+# Schéma des événements du fichier JSONL (les champs absents sont nuls)
+EVENT_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("timestamp", pa.timestamp("s")),
+    ("event_type", pa.string()),
+    ("region", pa.string()),
+    ("search_query", pa.string()),
+    ("product_id", pa.string()),
+    ("category", pa.string()),
+    ("price", pa.float64()),
+])
+JSON_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 128 * 1024
+# Comptes partiels accumulés avant fusion
+MERGE_EVERY = 64
+# Taille de fichier source par partition des clics avant achat
+PARTITION_BYTES = 512 * 1024 * 1024
+# Position de l'événement dans le fichier source, conservée par la conversion Parquet
+SEQUENCE_COLUMN = "seq"
+
+def open_events(path):
+    """Jeu de données paresseux sur un fichier JSONL, un fichier Parquet ou un répertoire Parquet partitionné"""
+    if os.path.isdir(path):
+        return ds.dataset(path, format="parquet", partitioning="hive")
+    if path.endswith(".parquet"):
+        return ds.dataset(path, format="parquet")
+    json_format = ds.JsonFileFormat(
+        parse_options=pajson.ParseOptions(explicit_schema=EVENT_SCHEMA, unexpected_field_behavior="ignore"),
+        read_options=pajson.ReadOptions(block_size=JSON_BLOCK_SIZE))
+    return ds.dataset(path, format=json_format, schema=EVENT_SCHEMA)
+
+def _timestamps(column):
+    """Colonne timestamp en date Arrow (chaînes ISO d'un Parquet non typé comprises)"""
+    if pa.types.is_timestamp(column.type):
+        return column
+    return pc.strptime(column, format="%Y-%m-%dT%H:%M:%S", unit="s")
+
+def scan(dataset, columns, event_types, batch_size=DEFAULT_BATCH_SIZE, required=()):
+    """Lots d'événements des types demandés, limités aux colonnes utiles et sans clé nulle"""
+    condition = pc.field("event_type").isin(event_types)
+    for column in required:
+        condition = condition & pc.field(column).is_valid()
+    return dataset.to_batches(columns=columns, filter=condition, batch_size=batch_size)
+
+def count_keys(batches, keys, derive=None):
+    """
+    Comptes par clé sur un flux de lots. Les comptes partiels sont fusionnés
+    tous les MERGE_EVERY lots, ce qui borne la mémoire au nombre de clés.
+    """
+    partials, merged = [], None
+    for batch in batches:
+        table = pa.Table.from_batches([batch])
+        if derive:
+            table = derive(table)
+        # Les clés sont non nulles (filtre de lecture): compter la première revient à compter les lignes
+        counts = table.group_by(keys).aggregate([(keys[0], "count")]).to_pandas()
+        partials.append(counts.rename(columns={f"{keys[0]}_count": "count"}))
+        if len(partials) >= MERGE_EVERY:
+            merged = _merge(partials if merged is None else [merged] + partials, keys)
+            partials = []
+    frames = partials if merged is None else [merged] + partials
+    if not frames:
+        return pd.DataFrame({**{key: pd.Series(dtype='object') for key in keys},
+                             "count": pd.Series(dtype='int64')})
+    return _merge(frames, keys)
+
+def _merge(frames, keys):
+    return pd.concat(frames, ignore_index=True).groupby(keys)['count'].sum().reset_index()
+
+def file_top_searches(dataset, batch_size=DEFAULT_BATCH_SIZE):
+    """Terme le plus recherché par heure, à partir des seules recherches"""
+    print("Analyse des recherches par heure (lecture du fichier)...")
+
+    def with_hour(table):
+        return pa.table({"hour": pc.hour(_timestamps(table["timestamp"])).cast(pa.int32()),
+                         "search_query": table["search_query"]})
+
+    batches = scan(dataset, ["timestamp", "search_query"], ["search"], batch_size, required=["timestamp", "search_query"])
+    hourly_searches = count_keys(batches, ["hour", "search_query"], with_hour)
+    if hourly_searches.empty:
+        print("Aucune recherche trouvée dans les données")
+        return None
+    return select_top_searches(hourly_searches)
+
+def file_top_products(dataset, batch_size=DEFAULT_BATCH_SIZE):
+    """Top 10 des produits cliqués par région, à partir des seuls clics"""
+    print("Analyse des produits par région (lecture du fichier)...")
+    keys = ["region", "product_id", "category"]
+    product_clicks = count_keys(scan(dataset, keys, ["click"], batch_size, required=keys), keys)
+    if product_clicks.empty:
+        print("Aucun clic trouvé dans les données")
+        return None
+    return select_top_products(product_clicks, sorted(product_clicks['region'].unique()))
+
+def file_average_clicks(dataset, size_bytes, batch_size=DEFAULT_BATCH_SIZE, spill_dir=None):
+    """
+    Nombre moyen de clics avant achat. Les clics et achats sont répartis par
+    hachage de user_id dans des fichiers Arrow temporaires (ordre du fichier
+    conservé), puis chaque partition est chargée et calculée seule.
+    """
+    print("Analyse des clics avant achat (lecture du fichier)...")
+    partitions = max(1, math.ceil(size_bytes / PARTITION_BYTES))
+    columns = ["user_id", "timestamp", "event_type"]
+    # Après conversion Parquet, l'ordre du fichier source départage les timestamps égaux
+    ordered = SEQUENCE_COLUMN in dataset.schema.names
+    if ordered:
+        columns.append(SEQUENCE_COLUMN)
+    directory = tempfile.mkdtemp(prefix="ecommerce-clicks-", dir=spill_dir)
+    try:
+        sinks, writers = {}, {}
+        for batch in scan(dataset, columns, ["click", "purchase"], batch_size, required=["user_id", "timestamp"]):
+            keys = partition_keys(batch.column("user_id").to_pandas(), partitions)
+            for partition in np.unique(keys):
+                rows = pa.array(np.flatnonzero(keys == partition))
+                part = batch.take(rows)
+                if partition not in writers:
+                    path = os.path.join(directory, f"part-{partition:04d}.arrow")
+                    sinks[partition] = pa.OSFile(path, 'wb')
+                    writers[partition] = pa.ipc.new_stream(sinks[partition], part.schema)
+                writers[partition].write_batch(part)
+        for partition, writer in writers.items():
+            writer.close()
+            sinks[partition].close()
+
+        clicks_total = purchases = 0
+        for partition in sorted(writers):
+            path = os.path.join(directory, f"part-{partition:04d}.arrow")
+            with pa.memory_map(path) as source:
+                events = pa.ipc.open_stream(source).read_all().to_pandas()
+            if ordered:
+                events = events.sort_values(SEQUENCE_COLUMN, kind='mergesort')
+            counts = clicks_per_purchase(events)
+            clicks_total += int(counts.sum())
+            purchases += len(counts)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    avg_clicks = float(clicks_total / purchases) if purchases else 0
+    print(f"Nombre moyen de clics avant achat: {avg_clicks:.2f}")
+    return avg_clicks
+
+def file_size(path):
+    """Taille totale d'un fichier ou d'un répertoire"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+def file_analysis(path, batch_size=DEFAULT_BATCH_SIZE):
+    """Les trois analyses sur un fichier d'événements. Retourne (clics moyens, top recherches, top produits)."""
+    dataset = open_events(path)
+    avg_clicks = file_average_clicks(dataset, file_size(path), batch_size)
+    top_searches = file_top_searches(dataset, batch_size)
+    top_products = file_top_products(dataset, batch_size)
+    return avg_clicks, top_searches, top_products
+
+def convert_to_parquet(path, output_dir, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Conversion du JSONL en Parquet partitionné par event_type, par lots (hors
+    mémoire). La position de chaque événement dans le fichier est conservée
+    (colonne seq), le partitionnement changeant l'ordre de lecture.
+    """
+    dataset = open_events(path)
+    schema = dataset.schema.append(pa.field(SEQUENCE_COLUMN, pa.int64()))
+
+    def numbered_batches():
+        offset = 0
+        for batch in dataset.to_batches(batch_size=batch_size):
+            sequence = pa.array(np.arange(offset, offset + batch.num_rows, dtype='int64'))
+            offset += batch.num_rows
+            yield pa.RecordBatch.from_arrays(batch.columns + [sequence], schema=schema)
+
+    ds.write_dataset(numbered_batches(), output_dir, schema=schema, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([("event_type", pa.string())]), flavor="hive"),
+                     existing_data_behavior="delete_matching")
+    print(f"Conversion Parquet terminée: {output_dir}")
+
+def check(path, batch_size=DEFAULT_BATCH_SIZE):
+    """Compare la lecture paresseuse au chargement pandas complet du même fichier"""
+    start_time = time.time()
+    actual = file_analysis(path, batch_size)
+    file_time = time.time() - start_time
+
+    df = open_events(path).to_table().to_pandas()
+    if SEQUENCE_COLUMN in df.columns:
+        df = df.sort_values(SEQUENCE_COLUMN, kind='mergesort').reset_index(drop=True)
+    expected = (average_clicks_before_purchase(df.copy()), top_searches_by_hour(df.copy()),
+                top_products_by_region(df.copy()))
+
+    same = (expected[0] == actual[0] and results_match(expected[1], actual[1]) and
+            results_match(expected[2], actual[2]))
+    print(f"Lecture paresseuse: {file_time:.2f}s")
+    print("Résultats identiques" if same else "Écart entre la lecture paresseuse et le chargement complet")
+    return same
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyses directement depuis un fichier d'événements")
+    parser.add_argument("input", nargs="?", default=SAMPLE_PATH,
+                        help="Fichier JSONL, fichier Parquet ou répertoire Parquet partitionné")
+    parser.add_argument("--to-parquet", metavar="REPERTOIRE",
+                        help="Convertit le fichier en Parquet partitionné par event_type")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare aux analyses pandas sur le fichier chargé en entier")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Taille des lots de lecture")
+    args = parser.parse_args()
+
+    if args.to_parquet:
+        convert_to_parquet(args.input, args.to_parquet, args.batch_size)
+    elif args.check:
+        sys.exit(0 if check(args.input, args.batch_size) else 1)
+    else:
+        avg_clicks, top_searches, top_products = file_analysis(args.input, args.batch_size)
+        if top_searches is not None:
+            print(top_searches.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
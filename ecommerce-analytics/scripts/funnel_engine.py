@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Moteur vectorisé de sessions et d'entonnoir de conversion.
+Partagé par simple_analysis.py et spark_analysis.py (vérification).
+
+Les événements sont triés une seule fois par (user_id, timestamp) et découpés
+en sessions: une nouvelle session commence à chaque changement d'utilisateur
+ou après une inactivité supérieure à l'intervalle choisi. Toutes les mesures
+sont ensuite calculées sur ce même ordre par des sommes cumulées par session:
+- entonnoir recherche -> clic -> achat (dans cet ordre, au sein d'une session);
+- clics par achat, remis à zéro à chaque achat et à chaque nouvelle session;
+- distributions de la durée et du nombre d'événements des sessions.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from clicks_engine import SAMPLE_PATH
+
+DEFAULT_SESSION_GAP_MINUTES = 30
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+def distribution(values):
+    """Résumé d'une distribution (moyenne, quantiles à interpolation linéaire, maximum)"""
+    values = pd.Series(values, dtype='float64')
+    if values.empty:
+        return {"mean": 0.0, **{name: 0.0 for name in QUANTILES}, "max": 0.0}
+    summary = {"mean": float(values.mean())}
+    summary.update({name: float(values.quantile(q)) for name, q in QUANTILES.items()})
+    summary["max"] = float(values.max())
+    return summary
+
+def _ratio(numerator, denominator):
+    return float(numerator / denominator) if denominator else 0.0
+
+def summarize(gap_minutes, users, sessions, session_steps, clicks, purchases, durations, sizes):
+    """
+    Assemble le résultat à partir des mesures agrégées:
+    session_steps = (sessions avec recherche, avec clic après recherche, avec achat après ce clic),
+    clicks = total des clics par achat sur `purchases` achats,
+    durations et sizes = distributions (voir distribution) des sessions.
+    """
+    searched, clicked, purchased = session_steps
+    return {
+        "gap_minutes": gap_minutes,
+        "users": int(users),
+        "sessions": int(sessions),
+        "funnel_sessions": {"search": int(searched), "click": int(clicked), "purchase": int(purchased)},
+        "conversion": {
+            "search_to_click": _ratio(clicked, searched),
+            "click_to_purchase": _ratio(purchased, clicked),
+            "search_to_purchase": _ratio(purchased, searched),
+        },
+        "purchases": int(purchases),
+        "avg_clicks_per_purchase": _ratio(int(clicks), purchases),
+        "session_duration_s": durations,
+        "session_events": sizes,
+    }
+
+def _session_cumsum(values, starts, session):
+    """Somme cumulée (incluse) remise à zéro au début de chaque session"""
+    total = np.cumsum(values)
+    return total - (total - values)[starts][session]
+
+def funnel_metrics(df, gap_minutes=DEFAULT_SESSION_GAP_MINUTES):
+    """
+    Sessions et entonnoir en un seul passage trié.
+    Retourne un dictionnaire de mesures (voir summarize).
+    """
+    events = df[['user_id', 'timestamp', 'event_type']]
+    if events.empty:
+        return summarize(gap_minutes, 0, 0, (0, 0, 0), 0, 0, distribution([]), distribution([]))
+
+    # Tri unique (stable pour conserver l'ordre des égalités de timestamp)
+    events = events.assign(timestamp=pd.to_datetime(events['timestamp'])) \
+                   .sort_values(['user_id', 'timestamp'], kind='mergesort')
+    user_key = pd.factorize(events['user_id'])[0]
+    timestamps = events['timestamp'].to_numpy(dtype='datetime64[ns]')
+    event_type = events['event_type'].to_numpy()
+    n = len(events)
+
+    # Découpage en sessions: changement d'utilisateur ou inactivité trop longue
+    new_session = np.ones(n, dtype=bool)
+    new_session[1:] = (user_key[1:] != user_key[:-1]) | \
+        (np.diff(timestamps) > np.timedelta64(gap_minutes * 60, 's'))
+    starts = np.flatnonzero(new_session)
+    session = np.cumsum(new_session) - 1
+
+    is_search = (event_type == 'search').astype('int64')
+    is_click = (event_type == 'click').astype('int64')
+    is_purchase = (event_type == 'purchase').astype('int64')
+
+    # Entonnoir ordonné: clic précédé d'une recherche, achat précédé d'un tel clic
+    click_after_search = is_click * (_session_cumsum(is_search, starts, session) > 0)
+    purchase_after_click = is_purchase * (_session_cumsum(click_after_search, starts, session) > 0)
+    session_steps = tuple(int((np.add.reduceat(step, starts) > 0).sum())
+                          for step in (is_search, click_after_search, purchase_after_click))
+
+    # Clics depuis l'achat précédent de la même session (ou le début de la session)
+    session_clicks = _session_cumsum(is_click, starts, session)
+    purchases = np.flatnonzero(is_purchase)
+    purchase_clicks = session_clicks[purchases]
+    previous = np.concatenate(([0], purchase_clicks[:-1]))
+    first_in_session = np.concatenate(([True], session[purchases][1:] != session[purchases][:-1]))
+    previous[first_in_session] = 0
+    clicks_per_purchase = purchase_clicks - previous
+
+    # Longueur des sessions: durée (premier au dernier événement) et nombre d'événements
+    ends = np.concatenate((starts[1:], [n])) - 1
+    durations = (timestamps[ends] - timestamps[starts]) / np.timedelta64(1, 's')
+    sizes = ends - starts + 1
+
+    return summarize(gap_minutes, user_key.max() + 1, len(starts), session_steps,
+                     clicks_per_purchase.sum(), len(clicks_per_purchase),
+                     distribution(durations), distribution(sizes))
+
+def _loop_funnel_metrics(df, gap_minutes=DEFAULT_SESSION_GAP_MINUTES):
+    """Implémentation de référence par boucle sur les événements, pour la vérification."""
+    df = df.assign(timestamp=pd.to_datetime(df['timestamp'])) \
+           .sort_values(['user_id', 'timestamp'], kind='mergesort')
+    gap = pd.Timedelta(minutes=gap_minutes)
+
+    sessions = []
+    clicks_per_purchase = []
+    current_user = previous_time = None
+    for user_id, timestamp, event_type in zip(df['user_id'], df['timestamp'], df['event_type']):
+        if user_id != current_user or timestamp - previous_time > gap:
+            sessions.append({"start": timestamp, "events": 0, "search": False,
+                             "click": False, "purchase": False})
+            current_user = user_id
+            clicks = 0
+        session = sessions[-1]
+        session["events"] += 1
+        session["end"] = timestamp
+        previous_time = timestamp
+
+        if event_type == 'search':
+            session["search"] = True
+        elif event_type == 'click':
+            clicks += 1
+            session["click"] = session["click"] or session["search"]
+        elif event_type == 'purchase':
+            clicks_per_purchase.append(clicks)
+            clicks = 0
+            session["purchase"] = session["purchase"] or session["click"]
+
+    steps = tuple(sum(session[step] for session in sessions) for step in ("search", "click", "purchase"))
+    durations = [(session["end"] - session["start"]).total_seconds() for session in sessions]
+    sizes = [session["events"] for session in sessions]
+    return summarize(gap_minutes, df['user_id'].nunique(), len(sessions), steps, sum(clicks_per_purchase),
+                     len(clicks_per_purchase), distribution(durations), distribution(sizes))
+
+def metrics_match(expected, actual, tolerance=1e-9):
+    """Compare deux résultats de funnel_metrics (valeurs flottantes à la tolérance près)"""
+    if isinstance(expected, dict):
+        return expected.keys() == actual.keys() and \
+            all(metrics_match(expected[k], actual[k], tolerance) for k in expected)
+    return abs(expected - actual) <= tolerance
+
+def print_metrics(metrics):
+    """Affichage lisible des mesures de sessions"""
+    conversion = metrics["conversion"]
+    durations = metrics["session_duration_s"]
+    print(f"Sessions (inactivité > {metrics['gap_minutes']} min): {metrics['sessions']} "
+          f"pour {metrics['users']} utilisateurs")
+    print(f"Entonnoir par session: {metrics['funnel_sessions']['search']} recherches -> "
+          f"{metrics['funnel_sessions']['click']} clics ({conversion['search_to_click']:.1%}) -> "
+          f"{metrics['funnel_sessions']['purchase']} achats ({conversion['click_to_purchase']:.1%}), "
+          f"conversion globale {conversion['search_to_purchase']:.1%}")
+    print(f"Clics par achat dans la session: {metrics['avg_clicks_per_purchase']:.2f}")
+    print(f"Durée des sessions: médiane {durations['p50'] / 60:.1f} min, "
+          f"p90 {durations['p90'] / 60:.1f} min, maximum {durations['max'] / 60:.1f} min")
+
+def verify(file_path, gap_minutes=DEFAULT_SESSION_GAP_MINUTES):
+    """Compare le moteur vectorisé à la boucle de référence sur un fichier JSON."""
+    df = pd.read_json(file_path, lines=True, dtype=False)
+
+    expected = _loop_funnel_metrics(df, gap_minutes)
+    actual = funnel_metrics(df, gap_minutes)
+
+    if not metrics_match(expected, actual):
+        print(f"Écart détecté:\n  attendu {expected}\n  calculé {actual}")
+        return False
+
+    print_metrics(actual)
+    print("Vérification réussie")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--verify", metavar="FICHIER", nargs="?", const=SAMPLE_PATH,
+                        help="Compare le moteur vectorisé à la boucle de référence")
+    parser.add_argument("--session-gap", type=int, default=DEFAULT_SESSION_GAP_MINUTES,
+                        help="Inactivité (minutes) au-delà de laquelle une nouvelle session commence")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(args.verify, args.session_gap) else 1)
+    parser.print_help()
+
+if __name__ == "__main__":
+    main()
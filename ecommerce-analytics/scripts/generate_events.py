@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Générateur d'événements synthétiques reproductibles (graine fixe), au même
+schéma et aux mêmes distributions que ecommerce_events.json:
+- mélange search / click / purchase, quatre régions équiprobables;
+- 6 termes de recherche, 6 catégories, produits P0001..P0100;
+- prix uniformes entre 10 et 300, timestamps à la minute sur 7 jours;
+- utilisateurs U1000..U9999 (nombre configurable).
+Le paramètre skew (loi de Zipf) concentre l'activité sur quelques
+utilisateurs et produits; skew=0 reproduit la distribution uniforme.
+"""
+
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+# Distributions observées sur le fichier d'exemple
+EVENT_TYPES = ["search", "click", "purchase"]
+EVENT_WEIGHTS = [0.5064, 0.2943, 0.1993]
+REGIONS = ["north", "south", "east", "west"]
+SEARCH_QUERIES = ["t-shirt", "python book", "lego", "headphones", "basketball", "laptop"]
+CATEGORIES = ["sports", "toys", "home", "electronics", "clothing", "books"]
+PRICE_RANGE = (10.0, 300.0)
+START_DATE = "2025-04-01"
+DAYS = 7
+FIRST_USER = 1000
+DEFAULT_USERS = 9000
+DEFAULT_PRODUCTS = 100
+
+# Taille fixe des tranches: la suite générée ne dépend que de la graine
+CHUNK_SIZE = 1000000
+
+def parse_count(value):
+    """Nombre d'événements avec suffixe optionnel: 10k, 1M, 100M"""
+    value = str(value).strip()
+    multipliers = {"k": 10**3, "m": 10**6, "g": 10**9}
+    if value and value[-1].lower() in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1].lower()])
+    return int(float(value))
+
+def zipf_weights(size, skew):
+    """Poids de tirage ∝ 1 / rang^skew (uniformes si skew == 0)"""
+    weights = 1.0 / np.arange(1, size + 1) ** skew
+    return weights / weights.sum()
+
+def _chunk_lines(rng, size, users, products, user_weights, product_weights, start):
+    """Tire une tranche d'événements et la formate en lignes JSON"""
+    event_types = rng.choice(len(EVENT_TYPES), size, p=EVENT_WEIGHTS)
+    regions = rng.integers(0, len(REGIONS), size)
+    user_ids = rng.choice(users, size, p=user_weights)
+    minutes = rng.integers(0, DAYS * 24 * 60, size)
+    timestamps = (start + minutes.astype('timedelta64[m]')).astype('datetime64[s]').astype(str)
+    queries = rng.integers(0, len(SEARCH_QUERIES), size)
+    product_ids = rng.choice(products, size, p=product_weights)
+    categories = rng.integers(0, len(CATEGORIES), size)
+    prices = np.round(rng.uniform(*PRICE_RANGE, size), 2)
+
+    lines = []
+    for event_type, region, user, timestamp, query, product, category, price in zip(
+            event_types.tolist(), regions.tolist(), user_ids.tolist(), timestamps.tolist(),
+            queries.tolist(), product_ids.tolist(), categories.tolist(), prices.tolist()):
+        head = (f'{{"user_id": "U{FIRST_USER + user}", "timestamp": "{timestamp}", '
+                f'"event_type": "{EVENT_TYPES[event_type]}", "region": "{REGIONS[region]}", ')
+        if event_type == 0:
+            lines.append(f'{head}"search_query": "{SEARCH_QUERIES[query]}"}}\n')
+        else:
+            lines.append(f'{head}"product_id": "P{product + 1:04d}", '
+                         f'"category": "{CATEGORIES[category]}", "price": {price!r}}}\n')
+    return lines, np.bincount(event_types, minlength=len(EVENT_TYPES))
+
+def write_events(file_path, events, seed=42, users=DEFAULT_USERS, products=DEFAULT_PRODUCTS, skew=0.0):
+    """
+    Écrit `events` événements synthétiques au format JSONL.
+    Retourne le nombre d'événements par type.
+    """
+    start_time = time.time()
+    rng = np.random.default_rng(seed)
+    # Les rangs de Zipf sont attribués à des identifiants mélangés
+    user_weights = zipf_weights(users, skew)[rng.permutation(users)]
+    product_weights = zipf_weights(products, skew)[rng.permutation(products)]
+    start = np.datetime64(START_DATE, 'm')
+
+    counts = Counter()
+    with open(file_path, 'w') as file:
+        for offset in range(0, events, CHUNK_SIZE):
+            lines, chunk_counts = _chunk_lines(rng, min(CHUNK_SIZE, events - offset), users, products,
+                                               user_weights, product_weights, start)
+            file.writelines(lines)
+            counts.update(dict(zip(EVENT_TYPES, chunk_counts.tolist())))
+
+    elapsed = time.time() - start_time
+    print(f"{events} événements générés dans {file_path} en {elapsed:.1f}s "
+          f"({', '.join(f'{name}: {counts[name]}' for name in EVENT_TYPES)})")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération d'événements e-commerce synthétiques")
+    parser.add_argument("--events", default="10k", help="Nombre d'événements (ex: 10k, 1M, 100M)")
+    parser.add_argument("--output", default="/app/data/synthetic_events.json", help="Fichier JSONL produit")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="Nombre d'utilisateurs distincts")
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS, help="Nombre de produits distincts")
+    parser.add_argument("--skew", type=float, default=0.0,
+                        help="Exposant de Zipf de l'activité des utilisateurs et produits (0: uniforme)")
+    args = parser.parse_args()
+
+    write_events(args.output, parse_count(args.events), args.seed, args.users, args.products, args.skew)
+
+if __name__ == "__main__":
+    main()
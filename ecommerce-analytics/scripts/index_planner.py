@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Plan d'index couvrants dérivé des requêtes des analyses.
+
+Les requêtes chaudes (agrégations du mode pushdown, chargement des clics et
+achats) sont décrites par leur filtre et les champs qu'elles lisent. Pour
+chacune, l'index est construit selon la règle égalité, tri, intervalle
+(event_type, region, puis timestamp), suivi des champs lus: la requête est
+alors couverte, sans lecture des documents (projection sans _id).
+Les index de même préfixe de recherche sont fusionnés en un seul, ce qui
+limite le nombre d'index mis à jour à chaque insertion, tant que les champs
+ajoutés au préfixe restent peu nombreux (MAX_MERGED_FIELDS): au-delà, l'index
+fusionné recopierait la plus grande partie de chaque événement et chaque
+requête garde son propre index. La largeur estimée des clés est affichée.
+
+Les chargements complets (modes dataframe et streaming) lisent tous les
+champs de tous les événements: les couvrir reviendrait à dupliquer la
+collection dans un index.
+
+Le rapport donne pour chaque index sa taille, sa durée de construction, ses
+lectures depuis le démarrage du serveur ($indexStats) et les requêtes
+d'analyse qui l'utilisent; un index ni lu ni utilisé par une analyse ne fait
+qu'alourdir les écritures et est signalé.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from pymongo import MongoClient, ASCENDING
+
+from ingest_data import MONGO_URI, DB_NAME, COLLECTION_NAME, create_indexes
+from pipelines import scope_filter, scope_match, top_searches_by_hour_pipeline, top_products_by_region_pipeline
+from query_scope import (add_scope_arguments, describe_scope, scope_from_args, plan_stages, uses_index,
+                         winning_plan_nodes)
+
+# Projection du chargement des clics et achats (clics avant achat, mode pushdown)
+CLICKS_PROJECTION = {"_id": 0, "user_id": 1, "timestamp": 1, "event_type": 1}
+# Portée représentative des options --from/--to/--region, pour dériver les index
+PLANNING_SCOPE = scope_filter(datetime(2025, 1, 1), datetime(2025, 1, 2), "region", typed=True)
+# Champs lus au plus ajoutés au préfixe de recherche d'un index fusionné
+MAX_MERGED_FIELDS = 2
+# Taille estimée d'une valeur de clé d'index, en octets (schéma typé, chaînes
+# de longueur moyenne du fichier d'exemple); 12 octets pour un champ inconnu
+FIELD_WIDTHS = {"event_type": 12, "region": 11, "timestamp": 9, "hour": 5, "date": 16,
+                "search_query": 14, "product_id": 11, "category": 12, "user_id": 11}
+DEFAULT_FIELD_WIDTH = 12
+
+def pipeline_fields(pipeline):
+    """Champs des documents lus par un pipeline (jusqu'au premier $group inclus)"""
+    fields = []
+
+    def collect(value):
+        if isinstance(value, str) and value.startswith("$") and not value.startswith("$$"):
+            field = value[1:].split(".")[0]
+            if field not in fields:
+                fields.append(field)
+        elif isinstance(value, dict):
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    for pipeline_stage in pipeline:
+        if "$match" in pipeline_stage:
+            fields.extend(field for field in pipeline_stage["$match"] if field not in fields)
+            continue
+        collect(pipeline_stage)
+        if "$group" in pipeline_stage:
+            break
+    return fields
+
+def hot_queries(scope=None, n=10):
+    """
+    Requêtes chaudes des analyses pour une portée: (nom, filtre, champs lus,
+    exécution). Une analyse dont la portée exclut tous les types est absente.
+    """
+    queries = []
+    searches = scope_match(["search"], scope)
+    if searches:
+        pipeline = top_searches_by_hour_pipeline(searches)
+        queries.append(("recherches par heure", searches, pipeline_fields(pipeline), pipeline))
+    products = scope_match(["click"], scope)
+    if products:
+        pipeline = top_products_by_region_pipeline(n, products)
+        queries.append(("produits par région", products, pipeline_fields(pipeline), pipeline))
+    clicks = scope_match(["click", "purchase"], scope)
+    if clicks:
+        fields = [field for field, keep in CLICKS_PROJECTION.items() if keep]
+        queries.append(("chargement clics et achats", clicks, fields, CLICKS_PROJECTION))
+    return queries
+
+def explain_query(collection, query):
+    """explain() d'une requête chaude (agrégation ou find avec projection)"""
+    _, match, _, execution = query
+    if isinstance(execution, list):
+        return collection.database.command("aggregate", collection.name, pipeline=execution, explain=True)
+    return collection.find(match, execution).explain()
+
+def index_keys(match, fields):
+    """
+    Clés de l'index couvrant une requête: champs en égalité (ou $in), puis en
+    intervalle, puis les autres champs lus. Retourne (clés, longueur du
+    préfixe de recherche).
+    """
+    equality, ranges = [], []
+    for field, condition in match.items():
+        if isinstance(condition, dict) and not set(condition) <= {"$eq", "$in"}:
+            ranges.append(field)
+        else:
+            equality.append(field)
+    keys = equality + ranges
+    prefix = len(keys)
+    keys += [field for field in fields if field not in keys]
+    return [(field, ASCENDING) for field in keys], prefix
+
+def plan_indexes(queries, max_merged_fields=MAX_MERGED_FIELDS):
+    """
+    Index couvrants des requêtes, fusionnés par préfixe de recherche: les
+    champs lus d'une requête sont ajoutés à l'index de même préfixe tant que
+    l'index garde au plus max_merged_fields champs après le préfixe; sinon
+    la requête a son propre index.
+    Retourne une liste (clés, rôle) au format de ingest_data.INDEXES.
+    """
+    plans = []
+    for name, match, fields, _ in queries:
+        keys, prefix = index_keys(match, fields)
+        seek, extra = keys[:prefix], keys[prefix:]
+        for plan in plans:
+            merged = plan["extra"] + [key for key in extra if key not in plan["extra"]]
+            if plan["seek"] == seek and len(merged) <= max_merged_fields:
+                plan["extra"] = merged
+                plan["queries"].append(name)
+                break
+        else:
+            plans.append({"seek": seek, "extra": list(extra), "queries": [name]})
+    return [(plan["seek"] + plan["extra"], "couvre: " + ", ".join(plan["queries"])) for plan in plans]
+
+def planned_indexes():
+    """Index couvrants des analyses, dérivés pour une portée complète (fenêtre et région)"""
+    return plan_indexes(hot_queries(PLANNING_SCOPE))
+
+def index_name(keys):
+    """Nom par défaut d'un index MongoDB (user_id_1, event_type_1_timestamp_-1...)"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def key_width(keys):
+    """Largeur estimée d'une clé d'index (somme des valeurs, hors RecordId), en octets"""
+    return sum(FIELD_WIDTHS.get(field, DEFAULT_FIELD_WIDTH) for field, _ in keys)
+
+def print_plan():
+    """Affiche les requêtes chaudes, l'index dérivé de chacune et le plan fusionné"""
+    print("Requêtes des analyses (portée --from/--to/--region):")
+    for name, match, fields, _ in hot_queries(PLANNING_SCOPE):
+        keys, _ = index_keys(match, fields)
+        print(f"  {name:<28} -> ({', '.join(field for field, _ in keys)})")
+    print("Index planifiés (largeur estimée des clés):")
+    for keys, role in planned_indexes():
+        print(f"  ~{key_width(keys):>3} o/clé  {index_name(keys)}  [{role}]")
+
+def analysis_index_usage(collection, scopes=({}, PLANNING_SCOPE)):
+    """Index utilisés par les plans retenus des requêtes d'analyse (nom d'index -> requêtes)"""
+    usage = {}
+    for scope in scopes:
+        for query in hot_queries(scope):
+            for node in winning_plan_nodes(explain_query(collection, query)):
+                if node.get("indexName"):
+                    usage.setdefault(node["indexName"], set()).add(query[0])
+    return usage
+
+def print_index_report(collection, build_times=None):
+    """
+    Taille, durée de construction, lectures et usage par les analyses de
+    chaque index. Signale les index qui ne servent qu'à ralentir les écritures.
+    """
+    build_times = build_times or {}
+    storage = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    sizes = storage.get("indexSizes", {})
+    reads = {stats["name"]: stats["accesses"]["ops"] for stats in collection.aggregate([{"$indexStats": {}}])}
+    usage = analysis_index_usage(collection)
+
+    print("\nIndex de la collection:")
+    print(f"  {'taille':>10} {'construction':>13} {'lectures':>9}  index [analyses]")
+    unused = []
+    for name in collection.index_information():
+        built = f"{build_times[name]:.2f}s" if name in build_times else "-"
+        queries = ", ".join(sorted(usage.get(name, []))) or "-"
+        print(f"  {sizes.get(name, 0) / 1024 / 1024:>8.1f}Mo {built:>13} {reads.get(name, 0):>9}  {name} [{queries}]")
+        if name != "_id_" and not reads.get(name) and name not in usage:
+            unused.append(name)
+
+    index_mb = storage.get("totalIndexSize", 0) / 1024 / 1024
+    data_mb = storage.get("size", 0) / 1024 / 1024
+    print(f"Chaque insertion met à jour {len(sizes)} index ({index_mb:.1f}Mo d'index pour {data_mb:.1f}Mo de données)")
+    if unused:
+        unused_mb = sum(sizes.get(name, 0) for name in unused) / 1024 / 1024
+        print(f"Amplification d'écriture: {len(unused)} index jamais lus et inutilisés par les analyses "
+              f"({unused_mb:.1f}Mo): {', '.join(unused)}")
+    return unused
+
+def is_covered(explain):
+    """Vrai si le plan retenu lit seulement un index (IXSCAN sans FETCH ni COLLSCAN)"""
+    return uses_index(explain) and "FETCH" not in plan_stages(explain)
+
+def check_covered(collection, scope):
+    """Vérifie que chaque requête chaude est couverte (IXSCAN sans FETCH ni COLLSCAN)"""
+    print(f"Couverture des requêtes pour la portée {describe_scope(scope) or 'complète'}:")
+    covered = True
+    for query in hot_queries(scope):
+        plan = explain_query(collection, query)
+        stages = plan_stages(plan)
+        ok = is_covered(plan)
+        covered = covered and ok
+        print(f"  {query[0]:<28} {'couverte' if ok else 'non couverte'} ({' <- '.join(stages)})")
+    print("Toutes les requêtes sont couvertes par un index" if covered else "Des requêtes lisent les documents")
+    return covered
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan d'index couvrants des requêtes d'analyse")
+    parser.add_argument("--build", action="store_true",
+                        help="Construit les index planifiés (après un chargement), puis affiche le rapport")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre d'index construits en parallèle")
+    parser.add_argument("--report", action="store_true",
+                        help="Taille, lectures et usage par les analyses de chaque index existant")
+    parser.add_argument("--check", action="store_true",
+                        help="Vérifie avec explain() que les requêtes des analyses sont couvertes")
+    add_scope_arguments(parser)
+    parser.add_argument("--mongo-uri", default=MONGO_URI, help="Serveur MongoDB")
+    args = parser.parse_args()
+
+    if not (args.build or args.report or args.check):
+        print_plan()
+        return
+
+    collection = MongoClient(args.mongo_uri)[DB_NAME][COLLECTION_NAME]
+    if args.build:
+        print_index_report(collection, create_indexes(collection, planned_indexes(), args.workers))
+    elif args.report:
+        print_index_report(collection)
+    if args.check:
+        sys.exit(0 if check_covered(collection, scope_from_args(args, collection)) else 1)
+
+if __name__ == "__main__":
+    main()
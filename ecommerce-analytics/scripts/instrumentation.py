@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Instrumentation des étapes du pipeline (ingestion, chargement, analyses,
+rendu des graphiques, sauvegarde des résultats).
+
+Pour chaque étape: temps réel et temps CPU, pic de mémoire résidente,
+lignes/documents en entrée et en sortie, nombre d'allers-retours MongoDB et
+documents reçus dans les lots de curseur (surveillance des commandes
+pymongo). Les octets échangés ne sont comptés qu'avec --bytes: les mesurer
+impose de réencoder chaque commande et chaque réponse en BSON, un coût
+ajouté au chemin mesuré. Les mesures sont
+écrites en lignes JSON et, en option, dans un fichier texte au format
+Prometheus (collecteur textfile de node_exporter). Une étape peut être
+profilée avec cProfile.
+
+Sans fichier de métriques configuré, les étapes ne sont pas mesurées.
+Les étapes ouvertes dans un thread secondaire (lots d'insertion parallèles)
+ne comptent que le trafic MongoDB et le CPU de ce thread, sans pic mémoire.
+Le trafic du connecteur Spark (JVM) n'est pas visible depuis Python.
+"""
+
+import argparse
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from bson import encode
+from pymongo import monitoring
+
+from streaming import peak_rss_mb
+
+# Configuration (variables d'environnement partagées par tous les scripts)
+METRICS_FILE_ENV = "METRICS_FILE"
+PROMETHEUS_FILE_ENV = "PROMETHEUS_FILE"
+PROFILE_STAGE_ENV = "PROFILE_STAGE"
+RUN_ID_ENV = "RUN_ID"
+BYTES_ENV = "METRICS_BYTES"
+PROFILE_DIR = '/app/data/metrics/profiles'
+PROFILE_TOP = 20
+
+_config = {"enabled": False, "script": None, "run_id": None, "metrics_file": None,
+           "prometheus_file": None, "profile_stage": None, "profile_dir": PROFILE_DIR, "bytes": False}
+_totals = {}  # (script, étape) -> cumuls exportés au format Prometheus
+_profilers = {}  # étape -> cProfile.Profile
+_lock = threading.Lock()
+_local = threading.local()
+
+# Compteurs MongoDB globaux et par thread
+MONGO_COUNTERS = ("round_trips", "docs_received", "bytes_sent", "bytes_received")
+_mongo = dict.fromkeys(MONGO_COUNTERS, 0)
+
+def reset_peak_rss():
+    """Remet à zéro le pic de mémoire résidente (Linux), pour une mesure par étape"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def stage_peak_rss_mb():
+    """Pic de mémoire résidente depuis la dernière remise à zéro, en Mo"""
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sans /proc: pic du processus depuis son démarrage
+    return peak_rss_mb()
+
+def _thread_counters():
+    if not hasattr(_local, "mongo"):
+        _local.mongo = dict.fromkeys(MONGO_COUNTERS, 0)
+    return _local.mongo
+
+def _document_size(document):
+    try:
+        return len(document.raw) if hasattr(document, "raw") else len(encode(document))
+    except Exception:
+        return 0
+
+def _batch_documents(reply):
+    """Documents du lot de curseur d'une réponse (find, aggregate, getMore), sans réencodage"""
+    try:
+        cursor = reply.get("cursor")
+        batch = cursor.get("firstBatch", cursor.get("nextBatch")) if cursor else None
+        return len(batch) if isinstance(batch, list) else 0
+    except Exception:
+        return 0
+
+def _count(**increments):
+    counters = _thread_counters()
+    with _lock:
+        for key, value in increments.items():
+            counters[key] += value
+            _mongo[key] += value
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """
+    Compte les commandes envoyées au serveur et les documents reçus; la
+    taille des commandes et réponses seulement si les octets sont demandés.
+    """
+
+    def started(self, event):
+        if _config["bytes"]:
+            _count(round_trips=1, bytes_sent=_document_size(event.command))
+        else:
+            _count(round_trips=1)
+
+    def succeeded(self, event):
+        if _config["bytes"]:
+            _count(docs_received=_batch_documents(event.reply), bytes_received=_document_size(event.reply))
+        else:
+            _count(docs_received=_batch_documents(event.reply))
+
+    def failed(self, event):
+        pass
+
+_listener = MongoCommandCounter()
+
+def configure(script, metrics_file=None, prometheus_file=None, profile_stage=None,
+              profile_dir=PROFILE_DIR, run_id=None, count_bytes=False):
+    """
+    Active l'instrumentation pour un script. Les paramètres non fournis sont
+    lus dans l'environnement (METRICS_FILE, PROMETHEUS_FILE, PROFILE_STAGE,
+    RUN_ID, METRICS_BYTES), pour qu'un même RUN_ID regroupe tous les scripts
+    d'une exécution.
+    À appeler avant la création des MongoClient.
+    """
+    metrics_file = metrics_file or os.environ.get(METRICS_FILE_ENV)
+    prometheus_file = prometheus_file or os.environ.get(PROMETHEUS_FILE_ENV)
+    _config.update({
+        "script": script,
+        "run_id": run_id or os.environ.get(RUN_ID_ENV) or uuid.uuid4().hex[:12],
+        "metrics_file": metrics_file,
+        "prometheus_file": prometheus_file,
+        "profile_stage": profile_stage or os.environ.get(PROFILE_STAGE_ENV),
+        "profile_dir": profile_dir,
+        "bytes": count_bytes or os.environ.get(BYTES_ENV, "") not in ("", "0"),
+        "enabled": bool(metrics_file or prometheus_file),
+    })
+    if not _config["enabled"]:
+        return
+    for path in (metrics_file, prometheus_file):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not getattr(configure, "_registered", False):
+        # Les écouteurs s'appliquent aux clients créés après leur enregistrement
+        monitoring.register(_listener)
+        atexit.register(write_prometheus)
+        atexit.register(print_profiles)
+        configure._registered = True
+
+def add_arguments(parser):
+    """Options d'instrumentation communes aux scripts"""
+    parser.add_argument("--metrics-file", default=None,
+                        help="Fichier JSON lines des mesures par étape (ou $METRICS_FILE)")
+    parser.add_argument("--prometheus-file", default=None,
+                        help="Fichier texte Prometheus des cumuls par étape (ou $PROMETHEUS_FILE)")
+    parser.add_argument("--profile-stage", default=None,
+                        help="Profile l'étape indiquée avec cProfile (ou $PROFILE_STAGE)")
+    parser.add_argument("--bytes", dest="count_bytes", action="store_true",
+                        help="Mesure aussi les octets échangés avec MongoDB, au prix d'un réencodage BSON "
+                             "de chaque commande et réponse (ou $METRICS_BYTES=1)")
+
+def configure_from_args(script, args):
+    configure(script, args.metrics_file, args.prometheus_file, args.profile_stage,
+              count_bytes=args.count_bytes)
+
+class Stage:
+    """Mesure d'une étape en cours; rows_in et rows_out peuvent être renseignés dans le bloc"""
+
+    def __init__(self, name, parent, rows_in=None, labels=None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.labels = labels or {}
+        self.main_thread = threading.current_thread() is threading.main_thread()
+        self.peak_mb = 0.0
+
+    def _mongo_snapshot(self):
+        if self.main_thread:
+            with _lock:
+                return dict(_mongo)
+        return dict(_thread_counters())
+
+    def start(self):
+        self.started_at = datetime.utcnow().isoformat()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = self._cpu_time()
+        self.mongo_start = self._mongo_snapshot()
+        if self.main_thread:
+            # Le pic courant reste attribué à l'étape parente avant la remise à zéro
+            if self.parent is not None:
+                self.parent.peak_mb = max(self.parent.peak_mb, stage_peak_rss_mb())
+            reset_peak_rss()
+
+    def _cpu_time(self):
+        if not self.main_thread:
+            return time.thread_time()
+        # Temps CPU du processus et de ses processus de travail terminés
+        times = os.times()
+        return time.process_time() + times.children_user + times.children_system
+
+    def stop(self, error=None):
+        wall = time.perf_counter() - self.wall_start
+        cpu = self._cpu_time() - self.cpu_start
+        mongo = self._mongo_snapshot()
+        record = {
+            "run_id": _config["run_id"],
+            "script": _config["script"],
+            "stage": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "started_at": self.started_at,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": None,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "mongo_round_trips": mongo["round_trips"] - self.mongo_start["round_trips"],
+            "mongo_docs_received": mongo["docs_received"] - self.mongo_start["docs_received"],
+            # Octets non mesurés sans --bytes
+            "mongo_bytes_sent": (mongo["bytes_sent"] - self.mongo_start["bytes_sent"]
+                                 if _config["bytes"] else None),
+            "mongo_bytes_received": (mongo["bytes_received"] - self.mongo_start["bytes_received"]
+                                     if _config["bytes"] else None),
+        }
+        if self.main_thread:
+            self.peak_mb = max(self.peak_mb, stage_peak_rss_mb())
+            record["peak_rss_mb"] = round(self.peak_mb, 1)
+            if self.parent is not None:
+                self.parent.peak_mb = max(self.parent.peak_mb, self.peak_mb)
+        if self.labels:
+            record["labels"] = self.labels
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        return record
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _emit(record):
+    """Écrit une mesure et l'ajoute aux cumuls Prometheus"""
+    with _lock:
+        if _config["metrics_file"]:
+            with open(_config["metrics_file"], 'a') as file:
+                file.write(json.dumps(record, default=str) + "\n")
+        totals = _totals.setdefault((record["script"], record["stage"]), {
+            "count": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0, "rows_in": 0,
+            "rows_out": 0, "mongo_round_trips": 0, "mongo_docs_received": 0, "mongo_bytes_sent": 0,
+            "mongo_bytes_received": 0, "errors": 0})
+        totals["count"] += 1
+        totals["errors"] += "error" in record
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], record["peak_rss_mb"] or 0.0)
+        for key in ("wall_s", "cpu_s", "rows_in", "rows_out", "mongo_round_trips", "mongo_docs_received",
+                    "mongo_bytes_sent", "mongo_bytes_received"):
+            totals[key] += record[key] or 0
+
+def _profile_path(name):
+    os.makedirs(_config["profile_dir"], exist_ok=True)
+    return os.path.join(_config["profile_dir"], f"{_config['script']}_{name}_{os.getpid()}.prof")
+
+def print_profiles():
+    """Affiche le résumé des étapes profilées (cumulé sur toutes leurs exécutions)"""
+    for name, profiler in _profilers.items():
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"Profil de l'étape {name} sauvegardé: {_profile_path(name)}")
+        print(output.getvalue())
+
+@contextmanager
+def stage(name, rows_in=None, **labels):
+    """
+    Mesure le bloc comme une étape nommée:
+
+        with stage("top_searches", rows_in=len(df)) as s:
+            result = top_searches_by_hour(df)
+            s.rows_out = len(result)
+
+    Les mesures d'une étape incluent celles de ses sous-étapes.
+    """
+    stack = _stack()
+    current = Stage(name, stack[-1] if stack else None, rows_in, labels)
+    if not _config["enabled"]:
+        yield current
+        return
+
+    profiler = None
+    if _config["profile_stage"] == name and current.main_thread:
+        # Un profileur par étape, cumulé sur ses exécutions successives
+        profiler = _profilers.setdefault(name, cProfile.Profile())
+    stack.append(current)
+    current.start()
+    if profiler:
+        profiler.enable()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        stack.pop()
+        _emit(current.stop(error))
+        if profiler:
+            profiler.dump_stats(_profile_path(name))
+
+def count_rows(result):
+    """Nombre de lignes d'un résultat (DataFrame, dictionnaire de DataFrames ou None)"""
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        return sum(len(value) for value in result.values())
+    return len(result)
+
+# Cumul -> (nom de la métrique, type, description, facteur d'échelle)
+METRICS = {
+    "count": ("ecommerce_stage_runs_total", "counter", "Nombre d'exécutions de l'étape", 1),
+    "errors": ("ecommerce_stage_errors_total", "counter", "Nombre d'exécutions en échec", 1),
+    "wall_s": ("ecommerce_stage_wall_seconds_total", "counter", "Temps réel cumulé", 1),
+    "cpu_s": ("ecommerce_stage_cpu_seconds_total", "counter", "Temps CPU cumulé", 1),
+    "peak_rss_mb": ("ecommerce_stage_peak_rss_bytes", "gauge", "Pic de mémoire résidente", 1024 * 1024),
+    "rows_in": ("ecommerce_stage_rows_in_total", "counter", "Lignes ou documents en entrée", 1),
+    "rows_out": ("ecommerce_stage_rows_out_total", "counter", "Lignes ou documents en sortie", 1),
+    "mongo_round_trips": ("ecommerce_stage_mongo_round_trips_total", "counter",
+                          "Commandes envoyées à MongoDB", 1),
+    "mongo_docs_received": ("ecommerce_stage_mongo_received_documents_total", "counter",
+                            "Documents reçus dans les lots de curseur MongoDB", 1),
+    "mongo_bytes_sent": ("ecommerce_stage_mongo_sent_bytes_total", "counter", "Octets envoyés à MongoDB", 1),
+    "mongo_bytes_received": ("ecommerce_stage_mongo_received_bytes_total", "counter",
+                             "Octets reçus de MongoDB", 1),
+}
+
+def write_prometheus():
+    """
+    Écrit les cumuls par étape au format texte Prometheus (remplacement atomique).
+    Le chemin peut contenir {script} pour un fichier par script.
+    """
+    path = _config["prometheus_file"]
+    if not path or not _totals:
+        return
+    path = path.replace("{script}", _config["script"])
+    lines = []
+    for key, (metric, kind, description, scale) in METRICS.items():
+        if key.startswith("mongo_bytes") and not _config["bytes"]:
+            continue
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (script, name), totals in sorted(_totals.items()):
+            value = totals[key] * scale
+            lines.append(f'{metric}{{script="{script}",stage="{name}"}} {value:g}')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+def summarize(metrics_file, run_id=None):
+    """Résumé par script et par étape d'une exécution (la dernière par défaut)"""
+    with open(metrics_file) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    if not records:
+        print("Aucune mesure enregistrée")
+        return {}
+    run_id = run_id or records[-1]["run_id"]
+    summary = {}
+    for record in records:
+        if record["run_id"] != run_id:
+            continue
+        totals = summary.setdefault((record["script"], record["stage"]), {
+            "count": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0, "rows_in": 0,
+            "rows_out": 0, "mongo_round_trips": 0, "mongo_docs_received": 0, "mongo_bytes": None})
+        totals["count"] += 1
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], record["peak_rss_mb"] or 0.0)
+        for key in ("wall_s", "cpu_s", "rows_in", "rows_out", "mongo_round_trips", "mongo_docs_received"):
+            totals[key] += record.get(key) or 0
+        if record.get("mongo_bytes_sent") is not None:
+            totals["mongo_bytes"] = ((totals["mongo_bytes"] or 0) + record["mongo_bytes_sent"]
+                                     + record["mongo_bytes_received"])
+
+    print(f"Exécution {run_id}:")
+    print(f"{'script':<16} {'étape':<18} {'n':>5} {'réel (s)':>9} {'CPU (s)':>9} {'pic Mo':>8} "
+          f"{'entrée':>10} {'sortie':>10} {'requêtes':>9} {'docs reçus':>10} {'Mo Mongo':>9}")
+    for (script, name), totals in summary.items():
+        # Octets affichés seulement s'ils ont été mesurés (--bytes)
+        mongo_mb = "-" if totals['mongo_bytes'] is None else f"{totals['mongo_bytes'] / 1024 / 1024:.1f}"
+        print(f"{script:<16} {name:<18} {totals['count']:>5} {totals['wall_s']:>9.2f} "
+              f"{totals['cpu_s']:>9.2f} {totals['peak_rss_mb']:>8.1f} {totals['rows_in']:>10} "
+              f"{totals['rows_out']:>10} {totals['mongo_round_trips']:>9} "
+              f"{totals['mongo_docs_received']:>10} {mongo_mb:>9}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Résumé des mesures par étape")
+    parser.add_argument("--summary", default=os.environ.get(METRICS_FILE_ENV),
+                        help="Fichier JSON lines des mesures (ou $METRICS_FILE)")
+    parser.add_argument("--run-id", default=None, help="Exécution à résumer (la dernière par défaut)")
+    args = parser.parse_args()
+    if not args.summary or not os.path.exists(args.summary):
+        parser.error("Fichier de mesures introuvable")
+    summarize(args.summary, args.run_id)
+
+if __name__ == "__main__":
+    main()
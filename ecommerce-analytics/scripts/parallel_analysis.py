@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Exécution pandas multi-processus des trois analyses, sans cluster Spark.
+
+Les événements sont répartis en partitions par hachage de user_id: toute
+l'histoire d'un utilisateur est dans une seule partition, ce qui rend le
+calcul des clics avant achat local. Les partitions sont écrites au format
+Arrow IPC en mémoire partagée (/dev/shm) et lues par les processus de
+travail sans copie ni pickle. Chaque partition renvoie des sommes et des
+comptes partiels, fusionnés exactement: les résultats sont identiques à
+l'exécution séquentielle.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from clicks_engine import SAMPLE_PATH, clicks_per_purchase
+from compact_frame import plain_columns
+from simple_analysis import (average_clicks_before_purchase, top_searches_by_hour, top_products_by_region,
+                             select_top_searches, select_top_products, results_match)
+
+# Colonnes transmises aux processus de travail
+COLUMNS = ["user_id", "timestamp", "event_type", "region", "search_query", "product_id", "category"]
+# Répertoire en mémoire partagée, avec repli sur le répertoire temporaire
+SHARED_DIR = '/dev/shm'
+DEFAULT_WORKERS = os.cpu_count() or 1
+PARTITIONS_PER_WORKER = 2
+
+def partition_keys(users, partitions):
+    """Numéro de partition de chaque événement, par hachage de l'utilisateur"""
+    if pd.api.types.is_integer_dtype(users):
+        return users.to_numpy() % partitions
+    return (pd.util.hash_pandas_object(users, index=False).to_numpy() % partitions).astype('int64')
+
+def write_partitions(df, partitions, directory):
+    """
+    Écrit une partition Arrow IPC par classe de hachage. L'ordre des lignes
+    est conservé dans chaque partition (tri stable), comme dans le DataFrame.
+    """
+    columns = [column for column in COLUMNS if column in df.columns]
+    keys = partition_keys(df['user_id'], partitions)
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(partitions + 1))
+    # Conversion Arrow unique, puis découpage par indices
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+
+    paths = []
+    for i in range(partitions):
+        rows = order[bounds[i]:bounds[i + 1]]
+        if not len(rows):
+            continue
+        part = table.take(rows)
+        path = os.path.join(directory, f"part-{i:04d}.arrow")
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, part.schema) as writer:
+            writer.write_table(part)
+        paths.append(path)
+    return paths
+
+def partition_partials(path):
+    """
+    Calcul d'une partition dans un processus de travail (lecture projetée en
+    mémoire, sans copie des tampons Arrow). Retourne les résultats partiels:
+    (somme des clics avant achat, nombre d'achats), comptes par (heure, terme),
+    comptes par (région, produit, catégorie).
+    """
+    with pa.memory_map(path) as source:
+        part = pa.ipc.open_file(source).read_all().to_pandas()
+
+    part['timestamp'] = pd.to_datetime(part['timestamp'])
+    counts = clicks_per_purchase(part)
+    clicks = (int(counts.sum()), len(counts))
+
+    part['hour'] = part['timestamp'].dt.hour
+    searches = part[part['event_type'] == 'search']
+    hourly_searches = searches.groupby(['hour', 'search_query'], observed=True).size().reset_index(name='count')
+
+    product_events = part[part['event_type'] == 'click']
+    product_clicks = product_events.groupby(['region', 'product_id', 'category'],
+                                            observed=True).size().reset_index(name='count')
+    return clicks, plain_columns(hourly_searches), plain_columns(product_clicks)
+
+def merge_counts(partials, keys):
+    """Somme exacte de comptes partiels, triée par clés comme un groupby séquentiel"""
+    counts = pd.concat(partials, ignore_index=True)
+    return counts.groupby(keys)['count'].sum().reset_index()
+
+def parallel_analysis(df, workers=DEFAULT_WORKERS, partitions=None):
+    """
+    Les trois analyses sur `workers` processus.
+    Retourne (clics moyens avant achat, top recherches par heure, top produits par région).
+    """
+    start_time = time.time()
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+    shared_dir = SHARED_DIR if os.path.isdir(SHARED_DIR) else None
+    directory = tempfile.mkdtemp(prefix="ecommerce-partitions-", dir=shared_dir)
+    try:
+        paths = write_partitions(df, partitions, directory)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(partition_partials, paths))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # Fusion: sommes et comptes entiers, donc exacts quel que soit le découpage
+    clicks_total = sum(clicks for (clicks, _), _, _ in partials)
+    purchases = sum(purchases for (_, purchases), _, _ in partials)
+    avg_clicks = float(clicks_total / purchases) if purchases else 0
+    print(f"Nombre moyen de clics avant achat: {avg_clicks:.2f}")
+
+    hourly_searches = merge_counts([searches for _, searches, _ in partials], ['hour', 'search_query'])
+    if hourly_searches.empty:
+        print("Aucune recherche trouvée dans les données")
+        top_searches = None
+    else:
+        top_searches = select_top_searches(hourly_searches)
+
+    product_clicks = merge_counts([products for _, _, products in partials],
+                                  ['region', 'product_id', 'category'])
+    if product_clicks.empty:
+        print("Aucun clic trouvé dans les données")
+        top_products = None
+    else:
+        top_products = select_top_products(product_clicks, df['region'].unique())
+
+    print(f"Analyse parallèle terminée en {time.time() - start_time:.1f}s "
+          f"({len(paths)} partitions, {workers} processus)")
+    return avg_clicks, top_searches, top_products
+
+def check(file_path, workers=DEFAULT_WORKERS):
+    """Compare l'exécution parallèle à l'exécution séquentielle sur un fichier JSONL"""
+    df = pd.read_json(file_path, lines=True, dtype=False)
+
+    start_time = time.time()
+    expected = (average_clicks_before_purchase(df.copy()), top_searches_by_hour(df.copy()),
+                top_products_by_region(df.copy()))
+    serial_time = time.time() - start_time
+
+    start_time = time.time()
+    actual = parallel_analysis(df.copy(), workers)
+    parallel_time = time.time() - start_time
+
+    same = (expected[0] == actual[0] and results_match(expected[1], actual[1]) and
+            list(expected[2]) == list(actual[2]) and results_match(expected[2], actual[2]))
+    print(f"Séquentiel: {serial_time:.2f}s, parallèle: {parallel_time:.2f}s")
+    print("Résultats identiques" if same else "Écart entre les exécutions séquentielle et parallèle")
+    return same
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyses pandas multi-processus")
+    parser.add_argument("--check", nargs="?", const=SAMPLE_PATH, metavar="FICHIER",
+                        help="Compare aux analyses séquentielles sur un fichier JSONL")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Nombre de processus")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.check, args.workers) else 1)
+    parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pipelines d'agrégation MongoDB utilisés par les analyses en mode pushdown.
+Les calculs sont faits côté serveur: seules les lignes de résultat reviennent.
+"""
+
+# Heure de l'événement: champ dérivé s'il existe (schéma typé), sinon calculée.
+# $toDate accepte aussi bien une date BSON qu'une chaîne ISO.
+HOUR_EXPRESSION = {"$ifNull": ["$hour", {"$hour": {"$toDate": "$timestamp"}}]}
+# Format des timestamps du schéma brut (chaînes ISO, comparables dans l'ordre lexicographique)
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EVENT_TYPES = ["search", "click", "purchase"]
+
+def scope_filter(start=None, end=None, region=None, event_types=None, typed=False):
+    """
+    Portée d'une analyse en filtre MongoDB: fenêtre [start, end[ sur timestamp,
+    région et types d'événements. Les bornes sont des datetime, converties en
+    chaînes ISO pour le schéma brut (typed=False). Chaque critère correspond
+    à un index de create_indexes.
+    """
+    scope = {}
+    if event_types:
+        scope["event_type"] = {"$in": list(event_types)}
+    window = {}
+    if start is not None:
+        window["$gte"] = start if typed else start.strftime(TIMESTAMP_FORMAT)
+    if end is not None:
+        window["$lt"] = end if typed else end.strftime(TIMESTAMP_FORMAT)
+    if window:
+        scope["timestamp"] = window
+    if region:
+        scope["region"] = region
+    return scope
+
+def scope_match(event_types, scope=None):
+    """
+    Filtre $match d'une analyse portant sur `event_types`, restreint à la
+    portée (voir scope_filter). Le type d'événement vient en tête pour
+    l'index (event_type, timestamp). Retourne None si la portée exclut tous
+    les types d'événements de l'analyse.
+    """
+    scope = dict(scope or {})
+    allowed = scope.pop("event_type", {"$in": event_types})["$in"]
+    selected = [event_type for event_type in event_types if event_type in allowed]
+    if not selected:
+        return None
+    return {"event_type": selected[0] if len(selected) == 1 else {"$in": selected}, **scope}
+
+def top_searches_by_hour_pipeline(match=None):
+    """
+    Terme le plus recherché pour chaque heure (24 lignes au plus).
+    Les égalités sont départagées par ordre alphabétique, comme en pandas.
+    match remplace le filtre par défaut (toutes les recherches).
+    """
+    return [
+        {"$match": match or {"event_type": "search"}},
+        {"$group": {
+            "_id": {
+                "hour": HOUR_EXPRESSION,
+                "search_query": "$search_query",
+            },
+            "count": {"$sum": 1},
+        }},
+    ] + _top_search_per_hour_stages()
+
+def _top_search_per_hour_stages():
+    """Sélection du premier terme de chaque heure, à partir de cases (hour, search_query)"""
+    return [
+        {"$sort": {"_id.hour": 1, "count": -1, "_id.search_query": 1}},
+        {"$group": {
+            "_id": "$_id.hour",
+            "top_search": {"$first": "$_id.search_query"},
+            "count": {"$first": "$count"},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "hour": "$_id", "top_search": 1, "count": 1}},
+    ]
+
+def top_products_by_region_pipeline(n=10, match=None):
+    """
+    Top N des produits cliqués par région (N lignes par région au plus).
+    Les égalités sont départagées par product_id puis category.
+    match remplace le filtre par défaut (tous les clics).
+    """
+    return [
+        {"$match": match or {"event_type": "click"}},
+        {"$group": {
+            "_id": {
+                "region": "$region",
+                "product_id": "$product_id",
+                "category": "$category",
+            },
+            "count": {"$sum": 1},
+        }},
+    ] + _top_products_stages(n)
+
+def _top_products_stages(n):
+    """Top N par région, à partir de cases (region, product_id, category)"""
+    return [
+        {"$sort": {"_id.region": 1, "count": -1, "_id.product_id": 1, "_id.category": 1}},
+        {"$group": {
+            "_id": "$_id.region",
+            "products": {"$push": {
+                "product_id": "$_id.product_id",
+                "category": "$_id.category",
+                "count": "$count",
+            }},
+        }},
+        {"$project": {"_id": 0, "region": "$_id", "products": {"$slice": ["$products", n]}}},
+        {"$sort": {"region": 1}},
+    ]
+
+def rollup_top_searches_by_hour_pipeline():
+    """Terme le plus recherché par heure, à partir du rollup (date, hour, search_query)"""
+    return [
+        {"$group": {
+            "_id": {"hour": "$_id.hour", "search_query": "$_id.search_query"},
+            "count": {"$sum": "$count"},
+        }},
+    ] + _top_search_per_hour_stages()
+
+def rollup_top_products_by_region_pipeline(n=10):
+    """Top N des produits par région, à partir du rollup (region, product_id, category)"""
+    return _top_products_stages(n)
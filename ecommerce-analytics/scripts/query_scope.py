@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Portée des analyses (fenêtre de temps, région, types d'événements) et
+vérification des plans d'exécution des requêtes générées.
+
+Les options --from/--to/--region/--event-type sont partagées par
+simple_analysis.py et spark_analysis.py. Elles deviennent un filtre $match
+appuyé sur les index de create_indexes; --check-plans vérifie avec
+explain() que chaque requête passe par un index (IXSCAN) et non par un
+parcours complet de la collection (COLLSCAN).
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from ingest_data import MONGO_URI, DB_NAME, COLLECTION_NAME
+from pipelines import (EVENT_TYPES, scope_filter, scope_match,
+                       top_searches_by_hour_pipeline, top_products_by_region_pipeline)
+from streaming import PROJECTION
+
+def parse_datetime(value):
+    """Date ou date-heure ISO (2025-04-02, 2025-04-02T10:00)"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide: {value} (format attendu: 2025-04-02 ou 2025-04-02T10:00)")
+
+def add_scope_arguments(parser):
+    """Options de portée communes aux scripts d'analyse"""
+    parser.add_argument("--from", dest="start", type=parse_datetime, default=None,
+                        help="Début de la fenêtre analysée (inclus), ex: 2025-04-02 ou 2025-04-02T10:00")
+    parser.add_argument("--to", dest="end", type=parse_datetime, default=None,
+                        help="Fin de la fenêtre analysée (exclue)")
+    parser.add_argument("--region", default=None, help="Limite les analyses à une région")
+    parser.add_argument("--event-type", dest="event_types", action="append", choices=EVENT_TYPES,
+                        help="Limite les analyses à un type d'événement (option répétable)")
+
+def timestamps_are_dates(collection):
+    """Vrai si les timestamps sont des dates BSON (schéma typé), faux pour des chaînes ISO"""
+    doc = collection.find_one({"timestamp": {"$exists": True}}, {"_id": 0, "timestamp": 1})
+    return bool(doc) and isinstance(doc["timestamp"], datetime)
+
+def scope_from_args(args, collection):
+    """Filtre de portée des options, au type de timestamp de la collection ({} sans option)"""
+    if not (args.start or args.end or args.region or args.event_types):
+        return {}
+    return scope_filter(args.start, args.end, args.region, args.event_types,
+                        typed=timestamps_are_dates(collection))
+
+def describe_scope(scope):
+    """Description lisible d'une portée, pour les messages et les paramètres stockés"""
+    return {key: ({op: (bound.isoformat() if isinstance(bound, datetime) else bound)
+                   for op, bound in value.items()} if isinstance(value, dict) else value)
+            for key, value in scope.items()}
+
+def analysis_queries(collection, scope, n=10):
+    """
+    Requêtes émises par les analyses pour une portée, sous forme de fonctions
+    retournant leur explain(). Les analyses exclues par la portée sont absentes.
+    """
+    db = collection.database
+    queries = []
+    if scope:
+        # Chargement du DataFrame (dataframe, snapshot) et curseur du mode streaming
+        load = scope_match(EVENT_TYPES, scope)
+        if load:
+            queries.append(("chargement", lambda: collection.find(load).explain()))
+            queries.append(("streaming", lambda: collection.find(load, PROJECTION).sort([("timestamp", 1), ("_id", 1)]).explain()))
+    clicks = scope_match(["click", "purchase"], scope)
+    if clicks:
+        queries.append(("chargement clics et achats", lambda: collection.find(
+            clicks, {"_id": 0, "user_id": 1, "timestamp": 1, "event_type": 1}).explain()))
+    searches = scope_match(["search"], scope)
+    if searches:
+        queries.append(("recherches par heure", lambda: db.command(
+            "aggregate", collection.name, pipeline=top_searches_by_hour_pipeline(searches), explain=True)))
+    products = scope_match(["click"], scope)
+    if products:
+        queries.append(("produits par région", lambda: db.command(
+            "aggregate", collection.name, pipeline=top_products_by_region_pipeline(n, products), explain=True)))
+    return queries
+
+def winning_plan_nodes(explain):
+    """Nœuds des plans retenus (winningPlan), où qu'ils soient dans la sortie d'explain()"""
+    nodes = []
+
+    def collect(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and isinstance(node.get("stage"), str):
+                nodes.append(node)
+            for key, value in node.items():
+                collect(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for value in node:
+                collect(value, in_plan)
+
+    collect(explain, False)
+    return nodes
+
+def plan_stages(explain):
+    """Étapes des plans retenus (winningPlan)"""
+    return [node["stage"] for node in winning_plan_nodes(explain)]
+
+def uses_index(explain):
+    """Vrai si le plan retenu passe par un index (IXSCAN) sans parcours complet (COLLSCAN)"""
+    stages = plan_stages(explain)
+    return "IXSCAN" in stages and "COLLSCAN" not in stages
+
+def check_query_plans(collection, scope, n=10):
+    """Vérifie que chaque requête des analyses utilise un index. Retourne True si aucune ne fait de COLLSCAN."""
+    print(f"Plans d'exécution pour la portée {describe_scope(scope) or 'complète'}:")
+    indexed = True
+    for name, explain in analysis_queries(collection, scope, n):
+        plan = explain()
+        stages = plan_stages(plan)
+        ok = uses_index(plan)
+        indexed = indexed and ok
+        print(f"  {name:<28} {'IXSCAN' if ok else 'COLLSCAN'} ({' <- '.join(stages)})")
+    print("Toutes les requêtes utilisent un index" if indexed else "Des requêtes parcourent toute la collection")
+    return indexed
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification des plans d'exécution des requêtes d'analyse")
+    add_scope_arguments(parser)
+    parser.add_argument("--mongo-uri", default=MONGO_URI, help="Serveur MongoDB")
+    args = parser.parse_args()
+
+    collection = MongoClient(args.mongo_uri)[DB_NAME][COLLECTION_NAME]
+    sys.exit(0 if check_query_plans(collection, scope_from_args(args, collection)) else 1)
+
+if __name__ == "__main__":
+    main()
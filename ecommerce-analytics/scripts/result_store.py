@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Stockage des résultats d'analyse indexé par l'empreinte des entrées.
+
+Chaque résultat est rangé sous une clé (nom de l'analyse, paramètres) avec
+l'empreinte de la collection events au moment du calcul: nombre de
+documents, _id maximal et points de reprise de l'ingestion incrémentale
+(dont les _id ne sont pas croissants). Tant que l'empreinte ne change pas,
+les résultats sont relus au lieu d'être recalculés.
+
+Les écritures qui ne changent ni le nombre de documents ni le _id maximal
+(ingest_data.py --migrate-types, réimport complet) sont repérées par un
+marqueur de dernière écriture enregistré avec les points de reprise.
+
+L'empreinte est prise avant le chargement des données: un ajout pendant le
+calcul rend simplement le résultat obsolète au passage suivant.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+import pandas as pd
+from pymongo import ReplaceOne, UpdateOne
+
+from ingest_data import CHECKPOINT_COLLECTION, COLLECTION_NAME, WRITE_MARKER_ID
+from snapshot import source_fingerprint
+
+RESULTS_COLLECTION = "analysis_results"
+# À incrémenter quand le format ou le calcul d'un résultat change, pour invalider le stock
+RESULT_FORMAT = 1
+
+def _digest(value):
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def input_fingerprint(db):
+    """
+    Empreinte des entrées: collection events, points de reprise de l'ingestion
+    et marqueur de la dernière écriture (migration en place comprise)
+    """
+    fingerprint = source_fingerprint(db[COLLECTION_NAME])
+    documents = list(db[CHECKPOINT_COLLECTION].find({}, {"offset": 1, "line": 1, "writes": 1, "updated_at": 1}))
+    marker = next((document for document in documents if document["_id"] == WRITE_MARKER_ID), {})
+    fingerprint["checkpoints"] = sorted(
+        [checkpoint["_id"], checkpoint.get("offset"), checkpoint.get("line")]
+        for checkpoint in documents if checkpoint["_id"] != WRITE_MARKER_ID)
+    fingerprint["last_write"] = [marker.get("writes"), str(marker["updated_at"]) if marker else None]
+    return fingerprint
+
+def result_key(analysis, params):
+    """Clé stable d'une analyse et de ses paramètres"""
+    return _digest({"analysis": analysis, "params": params})
+
+def encode_result(value):
+    """Résultat (valeur, DataFrame ou dictionnaire de DataFrames) vers document BSON"""
+    if isinstance(value, pd.DataFrame):
+        return {"type": "frame", "columns": [str(column) for column in value.columns],
+                "rows": value.to_dict('records')}
+    if isinstance(value, dict):
+        return {"type": "frames", "frames": {str(k): encode_result(v) for k, v in value.items()}}
+    return {"type": "value", "value": value}
+
+def decode_result(document):
+    """Inverse de encode_result"""
+    if document["type"] == "frame":
+        return pd.DataFrame(document["rows"], columns=document["columns"])
+    if document["type"] == "frames":
+        return {k: decode_result(v) for k, v in document["frames"].items()}
+    return document["value"]
+
+def load_results(db, analyses, fingerprint):
+    """
+    Résultats en stock pour `analyses` (nom -> paramètres) calculés sur des
+    entrées de même empreinte. Retourne un dictionnaire nom -> résultat, ou
+    None si l'un d'eux manque ou est obsolète.
+    """
+    keys = {result_key(name, params): name for name, params in analyses.items()}
+    documents = db[RESULTS_COLLECTION].find({
+        "_id": {"$in": list(keys)},
+        "fingerprint_hash": _digest(fingerprint),
+        "format": RESULT_FORMAT,
+    })
+    results = {keys[document["_id"]]: decode_result(document["result"]) for document in documents}
+    return results if len(results) == len(keys) else None
+
+def store_results(db, analyses, results, fingerprint):
+    """
+    Enregistre les résultats (nom -> résultat) en un seul bulk_write d'upserts.
+    Chaque document garde un numéro de version incrémenté à chaque recalcul.
+    """
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne({"_id": result_key(name, analyses[name])},
+                  {"$set": {"analysis": name,
+                            # En JSON: un filtre $match n'est pas un nom de champ valide
+                            "params": json.dumps(analyses[name], sort_keys=True, default=str),
+                            "fingerprint": fingerprint,
+                            "fingerprint_hash": _digest(fingerprint),
+                            "format": RESULT_FORMAT,
+                            "result": encode_result(result),
+                            "updated_at": now},
+                   "$inc": {"version": 1}},
+                  upsert=True)
+        for name, result in results.items()]
+    if operations:
+        db[RESULTS_COLLECTION].bulk_write(operations, ordered=False)
+
+def result_documents(data):
+    """Documents publiés pour un résultat, au format historique des collections de résultats"""
+    if isinstance(data, dict):
+        if all(isinstance(v, pd.DataFrame) for v in data.values()):
+            # Dictionnaire de DataFrames
+            return [{k: v.to_dict('records') for k, v in data.items()}]
+        # Dictionnaire simple
+        return [dict(data)]
+    if isinstance(data, pd.DataFrame):
+        return data.to_dict('records')
+    # Valeur simple
+    return [{"result": data}]
+
+def publish(collection, data):
+    """
+    Publie un résultat dans sa collection par remplacements groupés (upserts
+    sur le numéro de ligne), sans vider la collection au préalable: les
+    lecteurs ne voient jamais de collection vide. Les lignes en trop d'un
+    résultat précédent plus long sont ensuite supprimées.
+    """
+    documents = result_documents(data)
+    operations = [ReplaceOne({"_id": i}, {**document, "_id": i}, upsert=True)
+                  for i, document in enumerate(documents)]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    collection.delete_many({"_id": {"$not": {"$lt": len(documents)}}})
+    return len(documents)
@@ -1,6 +1,12 @@
 #!/bin/bash
 # Script d'automatisation pour l'ingestion et l'analyse des données
 
+# Mesures par étape de tous les scripts, regroupées sous un même identifiant d'exécution
+export RUN_ID="${RUN_ID:-$(date +%Y%m%dT%H%M%S)}"
+export METRICS_FILE="${METRICS_FILE:-/app/data/metrics/pipeline.jsonl}"
+PROMETHEUS_DEFAULT="/app/data/metrics/{script}.prom"  # un fichier par script
+export PROMETHEUS_FILE="${PROMETHEUS_FILE:-$PROMETHEUS_DEFAULT}"
+
 echo "Démarrage de l'analyse de données e-commerce..."
 
 # 1. Ingestion des données
@@ -13,3 +19,6 @@ python /app/scripts/spark_analysis.py
 
 echo "Analyse terminée! Les résultats sont disponibles dans /app/data/results/"
 echo "Vous pouvez également consulter les résultats dans la base MongoDB 'ecommerce'"
+
+# 3. Résumé des mesures
+python /app/scripts/instrumentation.py --summary "$METRICS_FILE" --run-id "$RUN_ID"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Analyse en flux des événements e-commerce, en un seul passage sur un curseur.
+La mémoire dépend du nombre de clés distinctes, pas du nombre d'événements.
+"""
+
+import resource
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+# Seuls les champs lus par les trois analyses sont transférés
+PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "timestamp": 1,
+    "event_type": 1,
+    "region": 1,
+    "search_query": 1,
+    "product_id": 1,
+    "category": 1,
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+def event_hour(timestamp):
+    """Heure d'un timestamp, qu'il soit une chaîne ISO ou un datetime"""
+    if isinstance(timestamp, str):
+        return int(timestamp[11:13])
+    return timestamp.hour
+
+class StreamingAnalysis:
+    """
+    État incrémental des trois analyses.
+
+    Les événements doivent arriver dans l'ordre chronologique: les clics
+    ouverts de chaque utilisateur sont rattachés à son prochain achat.
+    """
+
+    def __init__(self):
+        self.open_clicks = defaultdict(int)
+        self.purchases = 0
+        self.purchase_clicks = 0
+        self.hourly_searches = Counter()
+        self.product_clicks = Counter()
+        self.events = 0
+
+    def update(self, doc):
+        """Intègre un événement dans les trois analyses"""
+        self.events += 1
+        event_type = doc.get('event_type')
+
+        if event_type == 'click':
+            self.open_clicks[doc['user_id']] += 1
+            self.product_clicks[(doc['region'], doc['product_id'], doc['category'])] += 1
+        elif event_type == 'purchase':
+            # L'achat clôture la séquence de clics de l'utilisateur
+            self.purchase_clicks += self.open_clicks.pop(doc['user_id'], 0)
+            self.purchases += 1
+        elif event_type == 'search':
+            self.hourly_searches[(event_hour(doc['timestamp']), doc['search_query'])] += 1
+
+    def average_clicks(self):
+        """Nombre moyen de clics avant achat"""
+        if not self.purchases:
+            return 0
+        return self.purchase_clicks / self.purchases
+
+    def top_searches_by_hour(self):
+        """Terme le plus recherché par heure (égalités départagées par ordre alphabétique)"""
+        best = {}
+        for (hour, query), count in self.hourly_searches.items():
+            if hour not in best or (-count, query) < (-best[hour][1], best[hour][0]):
+                best[hour] = (query, count)
+        if not best:
+            return None
+
+        rows = [{'hour': hour, 'top_search': query, 'count': count}
+                for hour, (query, count) in sorted(best.items())]
+        return pd.DataFrame(rows, columns=['hour', 'top_search', 'count']).astype({'count': 'int64'})
+
+    def top_products_by_region(self, n=10):
+        """Top N des produits cliqués par région (égalités départagées par product_id)"""
+        by_region = defaultdict(list)
+        for (region, product_id, category), count in self.product_clicks.items():
+            by_region[region].append((-count, product_id, category))
+        if not by_region:
+            return None
+
+        result = {}
+        for region in sorted(by_region):
+            top = sorted(by_region[region])[:n]
+            result[region] = pd.DataFrame(
+                [{'region': region, 'product_id': p, 'category': c, 'count': -k} for k, p, c in top],
+                columns=['region', 'product_id', 'category', 'count']).astype({'count': 'int64'})
+        return result
+
+    def key_counts(self):
+        """Nombre de clés distinctes conservées en mémoire"""
+        return {
+            'open_click_users': len(self.open_clicks),
+            'hour_query_pairs': len(self.hourly_searches),
+            'region_products': len(self.product_clicks),
+        }
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus, en Mo (ru_maxrss est en Ko sous Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def stream_events(collection, query=None, batch_size=DEFAULT_BATCH_SIZE, state=None):
+    """
+    Parcourt la collection par ordre chronologique avec une projection,
+    et intègre chaque document à l'état sans matérialiser la collection.
+    _id départage les événements de même timestamp: l'ordre, et donc les
+    clics comptés avant un achat de la même seconde, est reproductible.
+    """
+    state = state or StreamingAnalysis()
+    cursor = collection.find(query or {}, PROJECTION) \
+                       .sort([("timestamp", 1), ("_id", 1)]) \
+                       .batch_size(batch_size)
+    for doc in cursor:
+        state.update(doc)
+    return state
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mode suivi: surveille un fichier JSONL qui grossit, ingère les nouvelles
+lignes par micro-lots et met à jour les résultats de façon incrémentale.
+"""
+
+import argparse
+import os
+import time
+
+from ingest_data import (DATA_PATH, DB_NAME, COLLECTION_NAME, complete_lines, connect_to_mongodb,
+                         create_indexes, has_checkpoint, incremental_import_data, is_timeseries,
+                         load_checkpoint, save_checkpoint)
+from rollups import apply_rollups
+from simple_analysis import save_to_mongodb
+from streaming import stream_events
+
+# Paramètres par défaut du suivi
+POLL_INTERVAL = 0.5
+REFRESH_INTERVAL = 2.0
+MICRO_BATCH_SIZE = 1000
+
+def publish(client, state):
+    """Écrit les résultats courants dans les collections de résultats"""
+    save_to_mongodb(client, {"avg_clicks_before_purchase": state.average_clicks()}, "avg_clicks_result")
+    top_searches = state.top_searches_by_hour()
+    if top_searches is not None:
+        save_to_mongodb(client, top_searches, "top_searches_by_hour")
+
+def follow(file_path, client, poll_interval=POLL_INTERVAL, refresh_interval=REFRESH_INTERVAL,
+           batch_size=MICRO_BATCH_SIZE, typed=False, rollups=False):
+    """
+    Boucle de suivi. L'état des analyses est initialisé par un passage sur la
+    collection, puis alimenté uniquement par les documents nouvellement insérés
+    (un rejeu de lignes déjà ingérées ne modifie donc pas les résultats).
+    Les lignes ajoutées sont supposées postérieures aux événements déjà connus.
+    Une collection déjà chargée sans point de reprise pour le fichier est suivie
+    à partir de la fin du fichier: ses lignes ne sont pas relues.
+    """
+    db = client[DB_NAME]
+    collection = db[COLLECTION_NAME]
+    create_indexes(collection)
+    # Série temporelle: les documents portent leurs méta-données de bucket
+    timeseries = is_timeseries(collection)
+
+    print("Initialisation de l'état à partir de la collection existante...")
+    state = stream_events(collection)
+    publish(client, state)
+    print(f"État initial: {state.events} événements, clés en mémoire: {state.key_counts()}")
+
+    def on_inserted(docs):
+        for doc in docs:
+            state.update(doc)
+        if rollups:
+            apply_rollups(db, docs)
+
+    # Lignes déjà chargées par un autre moyen: les relire doublerait les compteurs
+    if state.events and os.path.exists(file_path) and not has_checkpoint(db, file_path):
+        offset, line = complete_lines(file_path)
+        save_checkpoint(db, file_path, offset, line)
+        print(f"Aucun point de reprise pour {file_path}: suivi à partir de la ligne {line}")
+
+    # Taille du fichier au dernier import: une ligne finale incomplète laisse le point
+    # de reprise en deçà de la taille, sans nouvel import tant que le fichier ne change pas
+    seen_size, _ = load_checkpoint(db, file_path)
+    first_pending = None  # Instant où des données non publiées ont été détectées
+    last_refresh = time.time()
+    print(f"Suivi de {file_path} (Ctrl+C pour arrêter)...")
+    try:
+        while True:
+            size = os.path.getsize(file_path) if os.path.exists(file_path) else seen_size
+            if size != seen_size:
+                seen_size = size
+                detected = time.time()
+                totals = incremental_import_data(file_path, db, collection, batch_size,
+                                                 typed=typed, on_inserted=on_inserted, verbose=False,
+                                                 timeseries=timeseries)
+                if totals["inserted"]:
+                    first_pending = first_pending or detected
+                    print(f"{totals['inserted']} nouveaux événements ingérés")
+
+            now = time.time()
+            if first_pending and now - last_refresh >= refresh_interval:
+                publish(client, state)
+                print(f"Résultats rafraîchis ({state.events} événements, "
+                      f"délai {time.time() - first_pending:.1f}s)")
+                first_pending = None
+                last_refresh = now
+
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        publish(client, state)
+        print("Suivi arrêté, résultats publiés.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Suivi continu d'un fichier d'événements")
+    parser.add_argument("--file", default=DATA_PATH, help="Fichier JSONL à suivre")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="Intervalle de surveillance du fichier, en secondes")
+    parser.add_argument("--refresh-interval", type=float, default=REFRESH_INTERVAL,
+                        help="Intervalle minimal entre deux publications des résultats, en secondes")
+    parser.add_argument("--batch-size", type=int, default=MICRO_BATCH_SIZE,
+                        help="Taille des micro-lots d'insertion")
+    parser.add_argument("--typed", action="store_true",
+                        help="Stocke timestamp en date BSON et price en double")
+    parser.add_argument("--rollups", action="store_true",
+                        help="Maintient aussi les collections de rollups")
+    args = parser.parse_args()
+
+    follow(args.file, connect_to_mongodb(), args.poll_interval, args.refresh_interval,
+           args.batch_size, args.typed, args.rollups)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+"""Configuration commune des tests: les scripts s'importent à plat, comme dans /app/scripts."""
+
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Fichier d'exemple du dépôt (10 000 événements)
+SAMPLE_FILE = os.path.join(os.path.dirname(SCRIPTS_DIR), "data", "ecommerce_events.json")
+
+@pytest.fixture(scope="session")
+def sample_file():
+    return SAMPLE_FILE
+
+@pytest.fixture
+def mock_db():
+    """Base MongoDB en mémoire (mongomock), pour les tests sans serveur"""
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()["ecommerce"]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Non-régression du moteur vectorisé des clics avant achat contre la boucle iterrows() historique."""
+
+import pandas as pd
+import pytest
+
+from clicks_engine import _iterrows_clicks_per_purchase, average_clicks, clicks_per_purchase
+
+def events(*rows):
+    df = pd.DataFrame(rows, columns=["user_id", "timestamp", "event_type"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+def assert_matches_loop(df):
+    expected = _iterrows_clicks_per_purchase(df)
+    assert clicks_per_purchase(df).tolist() == expected
+    return expected
+
+def test_sample_file_matches_loop(sample_file):
+    df = pd.read_json(sample_file, lines=True)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    counts = assert_matches_loop(df)
+    assert len(counts) == (df["event_type"] == "purchase").sum()
+
+def test_user_without_purchase_is_ignored():
+    df = events(("U1", "2025-04-01T10:00:00", "click"),
+                ("U1", "2025-04-01T10:05:00", "click"),
+                ("U2", "2025-04-01T10:00:00", "click"),
+                ("U2", "2025-04-01T10:01:00", "purchase"))
+    assert assert_matches_loop(df) == [1]
+
+def test_purchase_without_earlier_click_counts_zero():
+    df = events(("U1", "2025-04-01T10:00:00", "search"),
+                ("U1", "2025-04-01T10:01:00", "purchase"),
+                ("U1", "2025-04-01T10:02:00", "click"),
+                ("U1", "2025-04-01T10:03:00", "purchase"),
+                ("U1", "2025-04-01T10:04:00", "purchase"))
+    assert assert_matches_loop(df) == [0, 1, 0]
+
+@pytest.mark.parametrize("order", [["click", "purchase"], ["purchase", "click"]])
+def test_equal_timestamps_keep_file_order(order):
+    df = events(("U1", "2025-04-01T10:00:00", "click"),
+                *[("U1", "2025-04-01T10:05:00", event_type) for event_type in order],
+                ("U1", "2025-04-01T10:06:00", "purchase"))
+    assert assert_matches_loop(df) == ([2, 0] if order[0] == "click" else [1, 1])
+
+def test_unsorted_input_and_interleaved_users():
+    df = events(("U2", "2025-04-01T10:03:00", "purchase"),
+                ("U1", "2025-04-01T10:02:00", "purchase"),
+                ("U2", "2025-04-01T10:01:00", "click"),
+                ("U1", "2025-04-01T10:00:00", "click"),
+                ("U1", "2025-04-01T10:01:00", "click"))
+    assert assert_matches_loop(df) == [2, 1]
+
+def test_empty_frame():
+    df = events()
+    assert assert_matches_loop(df) == []
+    assert average_clicks(df) == 0
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""Plan d'index couvrants (index_planner.py)."""
+
+from index_planner import MAX_MERGED_FIELDS, hot_queries, key_width, plan_indexes, PLANNING_SCOPE
+
+def query(name, fields, match=None):
+    return (name, match or {"event_type": "click", "timestamp": {"$gte": 0}}, fields, None)
+
+def test_queries_with_few_fields_share_an_index():
+    plans = plan_indexes([query("a", ["user_id"]), query("b", ["user_id", "category"])])
+    assert len(plans) == 1
+    keys, role = plans[0]
+    assert [field for field, _ in keys] == ["event_type", "timestamp", "user_id", "category"]
+    assert role == "couvre: a, b"
+
+def test_merge_is_capped():
+    plans = plan_indexes([query("a", ["hour", "search_query"]), query("b", ["product_id"])])
+    assert [[field for field, _ in keys] for keys, _ in plans] == [
+        ["event_type", "timestamp", "hour", "search_query"], ["event_type", "timestamp", "product_id"]]
+
+def test_different_seek_prefixes_are_not_merged():
+    plans = plan_indexes([query("a", ["user_id"]), query("b", ["user_id"], {"region": "north"})])
+    assert len(plans) == 2
+
+def test_planned_indexes_stay_narrow():
+    queries = hot_queries(PLANNING_SCOPE)
+    plans = plan_indexes(queries)
+    assert len(plans) == len(queries)
+    for keys, _ in plans:
+        # Préfixe de recherche (event_type, region, timestamp) plus au plus MAX_MERGED_FIELDS champs lus
+        assert len(keys) <= 3 + MAX_MERGED_FIELDS
+        assert key_width(keys) < 60
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Points de reprise de l'ingestion incrémentale (ingest_data.py --incremental)."""
+
+import json
+import os
+
+from ingest_data import (HEAD_BYTES, complete_lines, drop_stored_events, event_key, import_data,
+                         incremental_import_data, load_checkpoint, save_checkpoint, to_typed_document)
+
+EVENT = {"user_id": "U1", "timestamp": "2025-04-01T10:00:00", "event_type": "search", "search_query": "lampe"}
+
+def append_event(path, **fields):
+    with open(path, "a") as file:
+        file.write(json.dumps({**EVENT, **fields}) + "\n")
+
+def test_small_file_resumes_at_saved_offset_after_append(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    append_event(path)
+    offset = os.path.getsize(path)
+    assert offset < HEAD_BYTES
+    save_checkpoint(mock_db, path, offset, 1)
+
+    append_event(path, user_id="U2")
+    assert load_checkpoint(mock_db, path) == (offset, 1)
+
+def test_large_file_resumes_at_saved_offset_after_append(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    lines = 0
+    while lines == 0 or os.path.getsize(path) <= 2 * HEAD_BYTES:
+        append_event(path, user_id=f"U{lines}")
+        lines += 1
+    offset = os.path.getsize(path)
+    save_checkpoint(mock_db, path, offset, lines)
+
+    append_event(path, user_id="U2")
+    assert load_checkpoint(mock_db, path) == (offset, lines)
+
+def test_incremental_after_full_import_inserts_nothing(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    for i in range(5):
+        append_event(path, user_id=f"U{i}")
+    assert import_data(path, mock_db["events"]) == 5
+
+    totals = incremental_import_data(path, mock_db, mock_db["events"], verbose=False)
+    assert totals["inserted"] == 0
+    assert mock_db["events"].count_documents({}) == 5
+
+def test_full_import_checkpoint_stops_before_partial_line(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    append_event(path)
+    offset = os.path.getsize(path)
+    with open(path, "a") as file:
+        file.write('{"user_id": "U2"')
+    assert complete_lines(path) == (offset, 1)
+
+def test_replaced_file_restarts_from_beginning(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    append_event(path)
+    offset = os.path.getsize(path)
+    save_checkpoint(mock_db, path, offset, 1)
+
+    with open(path, "w") as file:
+        file.write(json.dumps({**EVENT, "user_id": "U9"}) + "\n")
+    append_event(path)
+    assert load_checkpoint(mock_db, path) == (0, 0)
+
+def test_truncated_file_restarts_from_beginning(tmp_path, mock_db):
+    path = str(tmp_path / "events.json")
+    append_event(path)
+    append_event(path, user_id="U2")
+    offset = os.path.getsize(path)
+    save_checkpoint(mock_db, path, offset, 2)
+
+    with open(path, "w") as file:
+        file.write(json.dumps(EVENT) + "\n")
+    assert load_checkpoint(mock_db, path) == (0, 0)
+
+def test_timeseries_batch_drops_stored_and_repeated_events(mock_db):
+    events = [{**EVENT, "user_id": user} for user in ("U1", "U2", "U2", "U3")]
+    docs = [to_typed_document({**event, "_id": event_key(event)}, timeseries=True) for event in events]
+    mock_db.events.insert_one(dict(docs[0]))
+
+    kept, dropped = drop_stored_events(mock_db.events, docs)
+    assert [doc["user_id"] for doc in kept] == ["U2", "U3"]
+    assert dropped == 2
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Vérification des plans d'exécution (query_scope.py --check-plans, index_planner.py --check)."""
+
+import os
+from datetime import datetime
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from index_planner import is_covered
+from ingest_data import MONGO_URI, create_indexes
+from pipelines import scope_filter
+from query_scope import check_query_plans, plan_stages, uses_index
+
+# Serveur des tests d'intégration (le service mongodb de docker-compose par défaut)
+TEST_MONGO_URI = os.environ.get("TEST_MONGO_URI", MONGO_URI)
+
+def find_explain(plan):
+    """Sortie d'explain() d'un find: plan retenu et plan rejeté (parcours complet)"""
+    return {"queryPlanner": {"winningPlan": plan, "rejectedPlans": [{"stage": "COLLSCAN"}]}}
+
+def aggregate_explain(plan):
+    """Sortie d'explain d'une agrégation: plan du curseur dans la première étape"""
+    return {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": plan}}},
+                       {"$group": {"_id": "$hour"}}]}
+
+IXSCAN = {"stage": "IXSCAN", "indexName": "event_type_1_timestamp_1"}
+FETCH = {"stage": "FETCH", "inputStage": IXSCAN}
+COLLSCAN = {"stage": "COLLSCAN", "filter": {"event_type": {"$eq": "click"}}}
+
+def test_index_scan_uses_index():
+    explain = find_explain(FETCH)
+    assert plan_stages(explain) == ["FETCH", "IXSCAN"]
+    assert uses_index(explain)
+
+def test_collection_scan_does_not_use_index():
+    assert not uses_index(find_explain(COLLSCAN))
+    assert not uses_index(aggregate_explain({"stage": "SORT", "inputStage": COLLSCAN}))
+
+def test_rejected_plans_are_ignored():
+    # Le COLLSCAN rejeté ne compte pas, seul le plan retenu est examiné
+    assert uses_index(find_explain(IXSCAN))
+
+def test_aggregate_and_slot_based_plans():
+    assert uses_index(aggregate_explain(FETCH))
+    # Moteur SBE (MongoDB 7): le plan retenu est sous queryPlan
+    assert uses_index({"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "GROUP", "inputStage": IXSCAN},
+                                                        "slotBasedPlan": {"stages": "..."}}}})
+
+def test_covered_plan_reads_no_document():
+    assert is_covered(find_explain({"stage": "PROJECTION_COVERED", "inputStage": IXSCAN}))
+    assert not is_covered(find_explain({"stage": "PROJECTION_SIMPLE", "inputStage": FETCH}))
+    assert not is_covered(find_explain(COLLSCAN))
+
+@pytest.fixture
+def mongod_collection():
+    client = MongoClient(TEST_MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"serveur MongoDB injoignable ({TEST_MONGO_URI})")
+    db = client["ecommerce_test_plans"]
+    yield db["events"]
+    client.drop_database(db.name)
+
+def test_scoped_queries_use_indexes_on_mongod(mongod_collection):
+    mongod_collection.insert_many([
+        {"user_id": f"U{i}", "timestamp": datetime(2025, 4, 1, i % 24), "event_type": event_type,
+         "region": "north", "search_query": "lampe", "product_id": "P1", "category": "home"}
+        for i in range(200) for event_type in ("search", "click", "purchase")])
+    create_indexes(mongod_collection)
+    scope = scope_filter(datetime(2025, 4, 1, 8), datetime(2025, 4, 1, 12), "north", typed=True)
+    assert check_query_plans(mongod_collection, scope)
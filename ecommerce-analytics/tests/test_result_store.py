@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""Empreinte des entrées du stock de résultats (result_store.py)."""
+
+import sys
+
+import ingest_data
+from ingest_data import mark_write, save_checkpoint
+from result_store import input_fingerprint
+
+def test_in_place_write_changes_fingerprint(mock_db):
+    mock_db.events.insert_many([{"_id": i, "timestamp": "2025-04-01T10:00:00"} for i in range(3)])
+    before = input_fingerprint(mock_db)
+
+    # Migration en place: même nombre de documents, même _id maximal
+    mock_db.events.update_many({}, {"$set": {"hour": 10}})
+    assert input_fingerprint(mock_db) == before
+    mark_write(mock_db, "migrate_types")
+    after = input_fingerprint(mock_db)
+    assert after != before
+    assert (after["count"], after["max_id"]) == (before["count"], before["max_id"])
+
+def test_write_marker_is_not_a_checkpoint(tmp_path, mock_db):
+    path = tmp_path / "events.json"
+    path.write_text('{"user_id": "U1"}\n')
+    save_checkpoint(mock_db, str(path), path.stat().st_size, 1)
+    mark_write(mock_db, "ingest_incremental")
+    assert [checkpoint[0] for checkpoint in input_fingerprint(mock_db)["checkpoints"]] == [str(path)]
+
+def test_empty_incremental_run_keeps_fingerprint(tmp_path, mock_db, monkeypatch):
+    path = tmp_path / "events.json"
+    path.write_text('{"user_id": "U1", "timestamp": "2025-04-01T10:00:00", "event_type": "search"}\n')
+    monkeypatch.setattr(ingest_data, "connect_to_mongodb", lambda: mock_db.client)
+    monkeypatch.setattr(ingest_data, "is_timeseries", lambda collection: False)
+    monkeypatch.setattr(ingest_data, "create_indexes", lambda collection, indexes=None, workers=1: {})
+    monkeypatch.setattr(sys, "argv", ["ingest_data.py", "--incremental", "--file", str(path)])
+
+    ingest_data.main()
+    before = input_fingerprint(mock_db)
+    assert before["last_write"][0] == 1
+    ingest_data.main()
+    assert input_fingerprint(mock_db) == before
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""Bornes d'erreur des métriques par sketches (sketch_metrics.py) sur le fichier d'exemple."""
+
+import pandas as pd
+import pytest
+
+from sketch_metrics import sketch_errors
+from sketches import HyperLogLog, KLLSketch, kll_rank_error
+
+@pytest.fixture(scope="module")
+def errors(sample_file):
+    return sketch_errors(pd.read_json(sample_file, lines=True, dtype=False))
+
+def test_distinct_users_total_within_standard_error(errors):
+    # Union de toutes les cases: une seule estimation, sous 1.04 / sqrt(m)
+    assert errors["total"] <= HyperLogLog().standard_error()
+
+def test_distinct_users_per_cell_within_three_standard_errors(errors):
+    # 96 estimations région/heure: la plus mauvaise reste sous 3 erreurs standard
+    assert errors["cells"] == 96
+    assert errors["users"] <= 3 * HyperLogLog().standard_error()
+
+def test_price_quantiles_within_rank_error(errors):
+    assert errors["categories"] == 6
+    assert errors["price_rank"] <= kll_rank_error(KLLSketch().k)
+
+def test_sketches_survive_document_round_trip():
+    users, prices = HyperLogLog(), KLLSketch(seed=0)
+    users.update_many([f"U{i}" for i in range(5000)])
+    prices.update_many([float(i) for i in range(5000)])
+    assert HyperLogLog.from_document(users.to_document()).count() == users.count()
+    assert KLLSketch.from_document(prices.to_document()).quantile(0.5) == prices.quantile(0.5)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+"""Parcours chronologique du mode streaming (streaming.py)."""
+
+from streaming import stream_events
+
+def test_same_second_events_are_ordered_by_id(mock_db):
+    # Achat inséré avant le clic de la même seconde: seul _id fixe l'ordre de lecture
+    mock_db.events.insert_many([
+        {"_id": "b", "user_id": "U1", "timestamp": "2025-04-01T10:00:00", "event_type": "purchase"},
+        {"_id": "a", "user_id": "U1", "timestamp": "2025-04-01T10:00:00", "event_type": "click",
+         "region": "east", "product_id": "P1", "category": "toys"},
+    ])
+    assert stream_events(mock_db.events).average_clicks() == 1
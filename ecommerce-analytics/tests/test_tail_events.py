@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""Mode suivi (tail_events.py) sur une collection déjà chargée."""
+
+import json
+
+import tail_events
+from ingest_data import load_checkpoint
+
+EVENT = {"user_id": "U1", "timestamp": "2025-04-01T10:00:00", "event_type": "click",
+         "region": "east", "product_id": "P1", "category": "toys"}
+
+def test_follow_without_checkpoint_starts_at_end_of_file(tmp_path, mock_db, monkeypatch):
+    path = str(tmp_path / "events.json")
+    with open(path, "w") as file:
+        for i in range(3):
+            file.write(json.dumps({**EVENT, "user_id": f"U{i}"}) + "\n")
+    # Collection chargée avant le suivi, sous des _id qui ne sont pas les clés des événements
+    mock_db["events"].insert_many([{**EVENT, "user_id": f"U{i}"} for i in range(3)])
+
+    monkeypatch.setattr(tail_events, "create_indexes", lambda collection: None)
+    monkeypatch.setattr(tail_events, "is_timeseries", lambda collection: False)
+    monkeypatch.setattr(tail_events, "publish", lambda client, state: None)
+    def stop(seconds):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(tail_events.time, "sleep", stop)
+
+    tail_events.follow(path, mock_db.client)
+    assert mock_db["events"].count_documents({}) == 3
+    assert load_checkpoint(mock_db, path)[1] == 3